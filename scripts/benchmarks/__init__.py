@@ -0,0 +1,21 @@
+# Copyright 2023 MohammadMohsen Akbarpoor Darabi (M. MAD)
+
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmarks of the generator on synthetic corpora of parts and scientists
+(see 'corpus') and the regression gates comparing them with the baselines
+stored on the same machine (see 'run'); run them from the root of the
+repository:
+
+    python scripts/benchmarks/run.py [SCALE ...] [--update] [--verbose]"""
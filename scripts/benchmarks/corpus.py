@@ -0,0 +1,153 @@
+# Copyright 2023 MohammadMohsen Akbarpoor Darabi (M. MAD)
+
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""Synthesizes corpora of parts and scientists at any scale: the md files
+are rendered from the md templates of the sections ('src_template_path')
+with front matter values and Persian text sampled from the real content, and
+the pictures are a (smaller) pool of generated images shared by the items"""
+
+import os
+from os import path as osp
+import importlib
+import json
+import random
+import re
+import shutil as su
+from typing import Any, Dict, List, Optional
+
+import frontmatter as fm
+from PIL import Image
+
+import blogger as b
+import fair
+from fair import common as c
+
+# 'fair.parts' and 'fair.scientists' are the sections, not their modules
+p = importlib.import_module("fair.parts")
+s = importlib.import_module("fair.scientists")
+
+KINDS = ("parts", "scientists")
+_PERSIAN_WORD = re.compile(r"^[؀-ۿ‌]+$")
+
+
+def sample_content(kind: str, src_path: Optional[str] = None) -> Dict[str, Any]:
+    """the words of the bodies and the values of every front matter field of
+    the real md files of 'kind' ({"words": [...], field: [values]})"""
+    src_path = src_path or getattr(fair, kind).src_path
+    words: List[str] = []
+    fields: Dict[str, List[Any]] = {}
+    for f in sorted(os.listdir(src_path)):
+        if not f.endswith(".md"):
+            continue
+        post = fm.load(osp.join(src_path, f))
+        for field, value in post.metadata.items():
+            fields.setdefault(field, []).append(value)
+        words.extend(w for w in c.html_to_text(post.content).split()
+                     if _PERSIAN_WORD.match(w))
+    fields["words"] = words
+    return fields
+
+
+def paragraphs(rng: random.Random, words: List[str], count: int) -> str:
+    """'count' html paragraphs of lines of 'words', like the real ones"""
+    return "\n".join(
+        "<p>\n{}\n</p>".format("\n".join(
+            " ".join(rng.choices(words, k=rng.randint(10, 14)))
+            for _ in range(rng.randint(3, 8))
+        ))
+        for _ in range(count)
+    )
+
+
+def part(rng: random.Random, sample: Dict[str, Any], pic: str) -> p.PartData:
+    title = " ".join(rng.choices(sample["words"], k=3))
+    return p.PartData(
+        title=title,
+        header=title,
+        pic=pic,
+        table=p.PartTable(
+            name=rng.choice(sample["name"]),
+            manufacturing_date=rng.choice(sample["manufacturing_date"]),
+            category=rng.choice(sample["category"]),
+            manufacturer_name=rng.choice(sample["manufacturer_name"]),
+            manufacturer_country=rng.choice(sample["manufacturer_country"])
+        ),
+        explanation_paragraphs=paragraphs(rng, sample["words"], rng.randint(1, 4))
+    )
+
+
+def scientist(rng: random.Random, sample: Dict[str, Any], pic: str) -> s.ScientistData:
+    title = " ".join(rng.choices(sample["words"], k=2))
+    return s.ScientistData(
+        title=title,
+        header=title,
+        pic=pic,
+        table=s.ScientistTable(
+            name=rng.choice(sample["name"]),
+            born=rng.choice(sample["born"]),
+            died=rng.choice(sample["died"]),
+            gender=rng.choice(sample["gender"]),
+            nationality=rng.choice(sample["nationality"]),
+            alma_mater=rng.choice(sample["alma_mater"]),
+            known_for=rng.choice(sample["known_for"]),
+            awards=rng.choice(sample["awards"]),
+            tags=rng.choice(sample["tags"])
+        ),
+        bio=paragraphs(rng, sample["words"], rng.randint(2, 6))
+    )
+
+
+def make_image(rng: random.Random, path: str, size=(800, 600)):
+    """a noisy gradient; compresses about as badly as a photo does"""
+    noise = Image.effect_noise(size, rng.randint(20, 60))
+    gradient = Image.linear_gradient("L").resize(size).rotate(rng.randint(0, 359))
+    Image.merge("RGB", (noise, gradient, Image.blend(noise, gradient, 0.5))).save(path)
+
+
+def synthesize(dst_path: str, kind: str, count: int, images: int = 50,
+               seed: int = 0, verbose: bool = False) -> str:
+    """writes a corpus of 'count' items of 'kind' (one of 'KINDS') sharing
+    'images' pictures to 'dst_path/kind' (unless it's already there) and
+    returns its path; the same arguments always make the same corpus"""
+    vp = b._vpg(verbose, "[synthesize]")
+    corpus_path = osp.join(dst_path, kind)
+    spec = {"kind": kind, "count": count, "images": images, "seed": seed}
+    spec_path = osp.join(dst_path, kind + ".json")
+    if osp.exists(spec_path):
+        with open(spec_path) as f:
+            if json.load(f) == spec:
+                vp("'{}' is already synthesized".format(corpus_path))
+                return corpus_path
+    # A corpus of another size may have more items
+    su.rmtree(corpus_path, ignore_errors=True)
+    rng = random.Random(seed)
+    sample = sample_content(kind)
+    sec = getattr(fair, kind)
+    template = b.get_template(sec.src_template_path)
+    os.makedirs(osp.join(corpus_path, "pics"), exist_ok=True)
+    pics = []
+    for i in range(min(images, count)):
+        pic = "pics/{}.png".format(i)
+        vp("Making '{}'".format(pic))
+        make_image(rng, osp.join(corpus_path, pic))
+        pics.append(pic)
+    make_item = part if kind == "parts" else scientist
+    for i in range(count):
+        fair.md_data_writer(make_item(rng, sample, pics[i % len(pics)]), template,
+                            osp.join(corpus_path, "{}_{:06d}.md".format(kind, i)))
+    vp("Wrote {} items to '{}'".format(count, corpus_path))
+    with open(spec_path, "w") as f:
+        json.dump(spec, f)
+    return corpus_path
@@ -0,0 +1,233 @@
+# Copyright 2023 MohammadMohsen Akbarpoor Darabi (M. MAD)
+
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""Runs the benchmarks and compares them with 'baselines.json'; it exits
+with 1 if any of them is slower than its baseline by more than the tolerance
+and the noise of both of them
+
+    python scripts/benchmarks/run.py [SCALE ...] [--update] [--tolerance=0.25] [--verbose]
+
+the timings of different machines are not comparable, so the baselines are
+only gated against on the machine they were made on (on the others the
+results are only printed); to check a change, run it with '--update' on the
+commit before the change and then without it on the change, on the same
+machine"""
+
+import sys
+import os
+from os import path as osp
+import json
+import platform
+import shutil as su
+import statistics
+import time
+from typing import Callable, Dict, List, Optional
+
+# The modules of the framework are the siblings of this package
+sys.path.insert(0, osp.dirname(osp.dirname(osp.abspath(__file__))))
+
+from attrs import evolve  # noqa: E402
+
+import blogger as b  # noqa: E402
+import fair  # noqa: E402
+from benchmarks import corpus  # noqa: E402
+
+SCALES = (1000, 10000, 100000)
+BASELINES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "baselines.json")
+# Where the corpora and the generated sites are put
+WORK_PATH = ".benchmarks"
+TOLERANCE = 0.25
+# Every benchmark is run this many times; its median is compared and its
+# spread (the slowest and fastest runs) is its noise band
+REPEAT = 7
+# Differences smaller than this (seconds) are noise, whatever their ratio
+MIN_DIFFERENCE = 0.05
+QR_PAGES_ROWS = 1
+QR_PAGES_COLS = 4
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.partition(":")[2].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def machine() -> str:
+    """what the timings depend on, other than the code"""
+    return "{} {}, {} cpus, Python {}".format(platform.system(), _cpu_model(),
+                                             os.cpu_count(), platform.python_version())
+
+
+def _cold():
+    """forgets what the previous runs have memoized"""
+    b._data_stores.clear()
+    b.qr_svg.cache_clear()
+
+
+def timings(run: Callable[[], None], setup: Optional[Callable[[], None]] = None) -> Dict:
+    """{"median", "min", "max"} of 'REPEAT' runs of 'run' in seconds"""
+    times: List[float] = []
+    for _ in range(REPEAT):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return {"median": round(statistics.median(times), 4), "min": round(min(times), 4),
+            "max": round(max(times), 4)}
+
+
+def section(kind: str, corpus_path: str, dst_path: str) -> b.SecSpec:
+    """the section of 'kind' in 'fair', working on the synthetic corpus"""
+    return evolve(getattr(fair, kind), src_path=corpus_path, dst_path=dst_path,
+                  qrpages_layout_path=None, post_generators=[])
+
+
+def benchmark(kind: str, scale: int, verbose: bool = False) -> Dict[str, Dict]:
+    """{"kind/scale/stage": timings}"""
+    corpus_path = corpus.synthesize(osp.join(WORK_PATH, "corpora", str(scale)), kind, scale,
+                                    verbose=verbose)
+    dst_path = osp.join(WORK_PATH, "sites", str(scale), kind)
+    manifest_path = osp.join(WORK_PATH, "sites", str(scale), kind + "_manifest.json")
+    sec = section(kind, corpus_path, dst_path)
+    args = dict(qr_pages_rows=QR_PAGES_ROWS, qr_pages_cols=QR_PAGES_COLS)
+
+    def clean():
+        _cold()
+        su.rmtree(dst_path, ignore_errors=True)
+        if osp.exists(manifest_path):
+            os.remove(manifest_path)
+
+    def clean_dir(name):
+        def setup():
+            _cold()
+            su.rmtree(osp.join(dst_path, name), ignore_errors=True)
+        return setup
+
+    results = {}
+
+    def record(stage, times):
+        results["{}/{}/{}".format(kind, scale, stage)] = times
+        print("{:<12} {:>7} {:<22} {:>9.3f}s ({:.3f}s - {:.3f}s)".format(
+            kind, scale, stage, times["median"], times["min"], times["max"]), flush=True)
+
+    record("generator", timings(lambda: b.generator(sec, **args), clean))
+    # The incremental rebuild of an unchanged corpus
+    b.generator(sec, manifest_path=manifest_path, **args)
+    record("generator (no-op)",
+           timings(lambda: b.generator(sec, manifest_path=manifest_path, **args), _cold))
+    record("content_generator", timings(lambda: b.content_generator(sec), clean))
+    # The following stages work on the output of the previous ones, like in
+    # 'generator' (the data store is left warm by 'content_generator')
+    b.content_generator(sec)
+    record("index_generator", timings(lambda: b.index_generator(sec)))
+    record("qr_imgs_generator",
+           timings(lambda: b.qr_imgs_generator(sec), clean_dir(sec.qr_dirname)))
+    record("qr_pages_generator",
+           timings(lambda: b.qr_pages_generator(sec, rows=QR_PAGES_ROWS, cols=QR_PAGES_COLS,
+                                                verbose=False),
+                   clean_dir(sec.qrpages_dirname)))
+    return results
+
+
+def load_baselines(path: str = BASELINES_PATH) -> Dict:
+    if not osp.exists(path):
+        return {"machine": None, "results": {}}
+    with open(path) as f:
+        baselines = json.load(f)
+    if "machine" not in baselines:  # Made by an older version
+        return {"machine": None, "results": {}}
+    return baselines
+
+
+def save_baselines(results: Dict[str, Dict], path: str = BASELINES_PATH):
+    """merges 'results' into the baselines of this machine (the ones of the
+    other machines are dropped)"""
+    baselines = load_baselines(path)
+    if baselines["machine"] != machine():
+        baselines = {"machine": machine(), "results": {}}
+    baselines["results"].update(results)
+    baselines["results"] = dict(sorted(baselines["results"].items()))
+    with open(path, "w") as f:
+        json.dump(baselines, f, indent=2)
+        f.write("\n")
+
+
+def regressed(now: Dict, baseline: Dict, tolerance: float = TOLERANCE) -> bool:
+    """whether 'now' is slower than 'baseline' beyond the tolerance and the
+    noise; the medians have to be apart by more than 'tolerance' (and
+    'MIN_DIFFERENCE') and every run of 'now' has to be slower than every run
+    of 'baseline' (their noise bands don't overlap)"""
+    return (now["median"] > baseline["median"] * (1 + tolerance)
+            and now["median"] - baseline["median"] > MIN_DIFFERENCE
+            and now["min"] > baseline["max"])
+
+
+def compare(results: Dict[str, Dict], tolerance: float = TOLERANCE,
+            path: str = BASELINES_PATH) -> bool:
+    """prints the results next to their baselines; returns False if any of
+    them is a regression (only if the baselines are of this machine)"""
+    baselines = load_baselines(path)
+    gated = baselines["machine"] == machine()
+    if not gated:
+        print("The baselines are of '{}', not this machine ('{}'); they are not gated "
+              "against, see '--update'".format(baselines["machine"], machine()))
+    passed = True
+    print("{:<42} {:>10} {:>10} {:>7}".format("benchmark", "baseline", "now", "ratio"))
+    for key, now in results.items():
+        baseline = baselines["results"].get(key)
+        if baseline is None:
+            print("{:<42} {:>10} {:>9.3f}s {:>7}  new".format(key, "-", now["median"], "-"))
+            continue
+        ratio = now["median"] / baseline["median"] if baseline["median"] else float("inf")
+        status = "ok"
+        if regressed(now, baseline, tolerance):
+            status = "REGRESSION" if gated else "slower"
+            passed = passed and not gated
+        elif regressed(baseline, now, tolerance):
+            status = "faster"
+        print("{:<42} {:>9.3f}s {:>9.3f}s {:>7.2f}  {}".format(key, baseline["median"],
+                                                             now["median"], ratio, status))
+    return passed
+
+
+def main():
+    args = sys.argv[1:]
+    scales = [int(a) for a in args if a.isdigit()] or [SCALES[0]]
+    verbose = "--verbose" in args
+    tolerance = TOLERANCE
+    for a in args:
+        if a.startswith("--tolerance="):
+            tolerance = float(a.partition("=")[2])
+    b.configure_environments()
+    print("Machine:", machine())
+    results = {}
+    for scale in scales:
+        for kind in corpus.KINDS:
+            results.update(benchmark(kind, scale, verbose))
+    if "--update" in args:
+        save_baselines(results)
+        print("Updated '{}'".format(BASELINES_PATH))
+    elif not compare(results, tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,11 +17,25 @@ import os
 from os import path as osp
 import shutil as su
 import re
-from typing import Collection, Optional, Type, Callable, Iterable, List, Dict, Any
+import hashlib
+import filecmp
+import json
+import itertools
+import heapq
+import time
+import tracemalloc
+from collections.abc import Mapping
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from typing import (Collection, Optional, Type, Callable, Iterable, Iterator, List, Dict,
+                    Tuple, Any)
 
 # from pprint import pprint
-from attrs import asdict, define, frozen, Factory
-from jinja2 import Environment, FileSystemLoader, select_autoescape, Template
+from attrs import asdict, define, fields, frozen, field, has, Factory
+from jinja2 import (Environment, FileSystemLoader, ChoiceLoader, ModuleLoader,
+                    FileSystemBytecodeCache, select_autoescape, Template)
 import qrcode as qr
 
 _NUKE_DST_PATH_PROMPT_FMT = """[generator] {sec}.rules.nuke_dst_path is set to \
@@ -39,8 +53,13 @@ MATCH_CSS = r"(?i:^.*\.css$)"
 MATCH_TTF = r"(?i:^.*\.ttf$)"  # TrueType Font
 MATCH_WOFF = r"(?i:^.*\.woff$)"  # Web Open Font Format
 MATCH_WOFF2 = r"(?i:^.*\.woff2$)"  # Web Open Font Format 2
+MATCH_PNG = r"(?i:^.*\.png$)"
+MATCH_JPG = r"(?i:^.*\.jpe?g$)"
+MATCH_SVG = r"(?i:^.*\.svg$)"
 MATCH_QR_PAGES = r"qr_codes_.+\.html"
-CE = (r"index\.html", MATCH_QR_PAGES)
+# The pages of a paginated index are "index.html", "index_2.html", etc
+MATCH_INDEX_PAGES = r"index(_\d+)?\.html"
+CE = (MATCH_INDEX_PAGES, MATCH_QR_PAGES)
 
 qr_row_type = List[str]
 qr_table_type = List[qr_row_type]
@@ -62,15 +81,35 @@ class Rules:
     copy_selected_data: bool = False
     recursive_copy: bool = True
     overwrite_when_copying: bool = False
+    # files that are identical to their destination are never overwritten;
+    # "stat" compares size and mtime, "hash" compares the contents
+    copy_compare: str = "stat"
+    # "copy", "hardlink" or "reflink" (copy-on-write clone, where the
+    # filesystem supports it); both links fall back to copying
+    copy_mode: str = "copy"
+    # Minify the generated (and copied) html pages and the copied stylesheets
+    # (see 'write_output')
+    minify_html: bool = False
+    minify_css: bool = False
 
     index_selectors: Iterable[str] = (MATCH_HTML, )
     # There is no 'index_selected_data'; you should use 'generate_index'
     # directly when instantiating the SecSpec
     recursive_index: bool = True
     onefile_index: bool = True
+    # The rows of every index page if 'onefile_index' is False
+    index_page_size: int = 100
     trees_in_index: bool = False  # False means flat index
 
 
+@frozen
+class QRParams:
+    error_correction: int = qr.constants.ERROR_CORRECT_M
+    box_size: int = 10  # pixels per module
+    border: int = 4  # in modules
+    image_format: str = "png"  # also the extension of the QR images
+
+
 @define
 class SecSpec:
     name: str
@@ -78,6 +117,9 @@ class SecSpec:
     url_prefix: Optional[str] = None
     src_path: Optional[str] = None
     sub_secs: list = Factory(list)
+    # Called as 'post_generator(sec, verbose)' once the section and its
+    # sub_secs are generated, in order (image variants, compression, etc)
+    post_generators: List[Callable[[Any, bool], None]] = Factory(list)
     data_spec: Optional[Type] = None
 
     src_template_path: Optional[str] = None
@@ -86,12 +128,17 @@ class SecSpec:
     # that file; 'data_generator' will enforce the 'rules'; thus
     # 'data_extractor' does not have anything to do with the 'rules'
     data_extractor: Optional[Callable[[str, str], Any]] = None
+    # Called as 'data_dependencies(dirpath, f, data_spec)' after a
+    # conversion; the paths of the other files the page depends on (like its
+    # pictures), so it's converted again when any of them changes
+    data_dependencies: Optional[Callable[[str, str, Any], Iterable[str]]] = None
 
     dst_template_path: Optional[str] = None
     # function to take a SecSpec, a filename relative to 'dst_path' and
-    # Dict[str, Any] (asdict(data_spec)), templates the DataSpec dict to
-    # 'src_template_path' and writes the resulting file to the filename
-    # relative to 'dst_path'
+    # Dict[str, Any] (the fields of the DataSpec; a shallow dict, the nested
+    # DataSpecs are not turned into dicts like 'asdict' would), templates the
+    # DataSpec to 'src_template_path' and writes the resulting file to the
+    # filename relative to 'dst_path'
     custom_data_writer: Optional[Callable[[Any, str, Template, Dict[str, Any]], None]] = None
     # dst_selectors: Iterable[str] = (MATCH_HTML, )  # selecting all files with ".html" extension
     rules: Rules = Rules()
@@ -102,19 +149,36 @@ class SecSpec:
     index_template_path: Optional[str] = None
     index_filename: str = "index.html"  # Is relative to output_path
     index_title: str = "Index"  # The title to show in the browser titlebar and on top of the index
+    # A JSON feed of the index rows (for sorting and filtering them in the
+    # browser), relative to output_path
+    index_feed_filename: Optional[str] = None
     # a function to extract a single IndexRow
     index_extractor: Optional[Callable[[str, str], Any]] = None
+    # function to take 'dirpath' and 'f' of a generated file and the data_spec
+    # it was generated from and build a single IndexRow out of it; if it's
+    # provided, 'index_extractor' is only used for the files without a source
+    index_row_builder: Optional[Callable[[str, str, Any], Any]] = None
     custom_index_writer: Optional[Callable[[Any, Template, Collection], None]] = None
+    # function to take 'dirpath' and 'f' of a source and its data_spec and
+    # return the texts to search in by field ({"title": ..., ...}); see
+    # 'publish.search'
+    search_document_builder: Optional[Callable[[str, str, Any], Dict[str, Any]]] = None
 
 
     generate_qr: bool = True
     custom_qr_generator: Optional[Callable[[Any, Iterable[str], bool, Iterable[str], int, int, str, str, bool], None]] = None
     custom_qr_img_generator: Optional[Callable[[Any, Iterable[str], bool], None]] = None
     qr_dirname: str = "qr_codes"  # Is relative to output_path
+    qr_params: QRParams = QRParams()
     generate_qrpages: bool = True
     custom_qrpages_extractor: Optional[Callable[[Any, int, int, Iterable[str]], qr_pages_type]] = None
     qrpages_template_path: Optional[str] = None
     qrpages_dirname: str = "qr_codes/pages"  # Is relative to output_path
+    # Embed the QR codes into the QR Pages as inline SVGs (see 'qr_svg')
+    # instead of linking to the QR images
+    qrpages_inline_svg: bool = False
+    # A JSON file pinning the QR codes to their page/slot (see 'iter_qr_pages')
+    qrpages_layout_path: Optional[str] = None
     custom_qr_table_writer: Optional[Callable[[Any, qr_table_type, Template, str, str, str], None]] = None
 
 
@@ -132,6 +196,73 @@ def re_collection_searcher(iterable, string):
     return False
 
 
+# Patterns that only match a (case insensitive) file extension; they are
+# matched with a set lookup instead of a regex search
+_EXTENSION_PATTERNS = {
+    MATCH_MD: ".md",
+    MATCH_HTML: ".html",
+    MATCH_CSS: ".css",
+    MATCH_TTF: ".ttf",
+    MATCH_WOFF: ".woff",
+    MATCH_WOFF2: ".woff2",
+    MATCH_PNG: ".png",
+    MATCH_SVG: ".svg",
+}
+
+
+class Selector:
+    """a collection of patterns compiled into a single matcher; a filename
+    is selected if any of the patterns can be found in it (the same as
+    're_collection_searcher'), the results are memoized per filename"""
+    __slots__ = ("patterns", "_everything", "_extensions", "_regexes", "_cache")
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = tuple(patterns)
+        self._everything = MATCH_EVERYTHING in self.patterns
+        self._extensions = frozenset(
+            _EXTENSION_PATTERNS[p] for p in self.patterns if p in _EXTENSION_PATTERNS)
+        rest = [re.compile(p) for p in self.patterns
+                if p not in _EXTENSION_PATTERNS and p != MATCH_NOTHING]
+        # Patterns with groups could have back references which would not
+        # survive being merged into an alternation
+        if len(rest) > 1 and all(r.groups == 0 for r in rest):
+            try:
+                rest = [re.compile("|".join("(?:{})".format(r.pattern) for r in rest))]
+            except re.error:  # e.g. global flags in the middle of the pattern
+                pass
+        self._regexes = rest
+        self._cache: Dict[str, bool] = {}
+
+    def __call__(self, f: str) -> bool:
+        selected = self._cache.get(f)
+        if selected is None:
+            selected = self._cache[f] = self._match(f)
+        return selected
+
+    def _match(self, f: str) -> bool:
+        if self._everything:
+            return True
+        head, dot, ext = f.rpartition(".")
+        if self._extensions and dot and "." + ext.lower() in self._extensions:
+            return True
+        for r in self._regexes:
+            if r.search(f) is not None:
+                return True
+        return False
+
+
+_selectors: Dict[tuple, Selector] = {}
+
+
+def compile_selectors(patterns: Iterable[str]) -> Selector:
+    """returns the (shared) Selector of 'patterns'"""
+    patterns = tuple(patterns)
+    selector = _selectors.get(patterns)
+    if selector is None:
+        selector = _selectors[patterns] = Selector(patterns)
+    return selector
+
+
 def _vpg(verbose: bool, prefix: str, sep: Optional[str] = " ", end: Optional[str] = "\n",
          file: Optional[str] = None, flush: bool = False):
     if not verbose:
@@ -148,8 +279,1069 @@ def _vpg(verbose: bool, prefix: str, sep: Optional[str] = " ", end: Optional[str
     return vp
 
 
+# Profiling
+
+
+def _io_counters() -> Tuple[int, int]:
+    """the bytes this process has read and written so far (0, 0 where
+    /proc/self/io is not available)"""
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+    except OSError:
+        return 0, 0
+    return int(counters["rchar"]), int(counters["wchar"])
+
+
+@define
+class StageStats:
+    files: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+    # The peak of the memory traced by tracemalloc while the stage was running
+    peak_memory: int = 0
+    read_bytes: int = 0
+    written_bytes: int = 0
+
+    def add(self, other: "StageStats"):
+        self.files += other.files
+        self.wall += other.wall
+        self.cpu += other.cpu
+        self.peak_memory = max(self.peak_memory, other.peak_memory)
+        self.read_bytes += other.read_bytes
+        self.written_bytes += other.written_bytes
+
+
+@define
+class Profiler:
+    """Records the wall and CPU time, the peak memory and the bytes read and
+    written of every stage of every section (and the slowest files) while
+    it's the active profiler (see 'generator's 'profile'); stages nested in
+    another one (like copying in the middle of converting) are not counted
+    twice, the outer one is paused meanwhile
+
+    the work of worker processes is counted as the time the stage waited for
+    them, the files they worked on are recorded with the times they measured
+    (see 'add_file')"""
+    slowest_files: int = 20
+    # (section, stage) -> StageStats
+    stats: Dict[Tuple[str, str], StageStats] = Factory(dict)
+    # A min heap of (wall, section, stage, path) of the slowest files
+    files: List[Tuple[float, str, str, str]] = Factory(list)
+    # The stages being run (outermost first): [(section, stage), start]
+    _stack: List[list] = Factory(list)
+
+    def _snapshot(self) -> Tuple[float, float, int, int]:
+        return (time.perf_counter(), time.process_time()) + _io_counters()
+
+    def _charge(self, key: Tuple[str, str], start: Tuple[float, float, int, int],
+                now: Tuple[float, float, int, int]):
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = StageStats()
+        stats.add(StageStats(
+            wall=now[0] - start[0], cpu=now[1] - start[1],
+            peak_memory=tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0,
+            read_bytes=now[2] - start[2], written_bytes=now[3] - start[3]
+        ))
+
+    @contextmanager
+    def stage(self, section: str, stage: str, path: Optional[str] = None):
+        """records the time spent in the block as 'stage' of 'section'; with
+        a 'path', as the time spent on that file too"""
+        now = self._snapshot()
+        if self._stack:
+            self._charge(*self._stack[-1], now)
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        entry = [(section, stage), now]
+        self._stack.append(entry)
+        try:
+            yield
+        finally:
+            now = self._snapshot()
+            self._stack.pop()
+            self._charge(*entry, now)
+            if path is not None:
+                self.stats[entry[0]].files += 1
+                record = (now[0] - entry[1][0], section, stage, path)
+                self._add_record(record)
+            if self._stack:
+                self._stack[-1][1] = now
+                if tracemalloc.is_tracing():
+                    tracemalloc.reset_peak()
+
+    def _add_record(self, record: Tuple[float, str, str, str]):
+        if len(self.files) < self.slowest_files:
+            heapq.heappush(self.files, record)
+        else:
+            heapq.heappushpop(self.files, record)
+
+    def add_file(self, section: str, stage: str, path: str, wall: float, cpu: float):
+        """records a file of 'stage' of 'section' worked on somewhere else
+        (like in a worker process) in 'wall' and 'cpu' seconds; its wall time
+        is already in the stage (as the time it waited), its cpu time is not"""
+        stats = self.stats.get((section, stage))
+        if stats is None:
+            stats = self.stats[(section, stage)] = StageStats()
+        stats.files += 1
+        stats.cpu += cpu
+        self._add_record((wall, section, stage, path))
+
+    def report(self) -> Dict[str, Any]:
+        total = StageStats()
+        sections: Dict[str, Dict[str, Any]] = {}
+        stages: Dict[str, StageStats] = {}
+        for (section, stage), stats in self.stats.items():
+            total.add(stats)
+            sec_report = sections.setdefault(section, {"total": StageStats(), "stages": {}})
+            sec_report["total"].add(stats)
+            sec_report["stages"][stage] = asdict(stats)
+            stages.setdefault(stage, StageStats()).add(stats)
+        return {
+            "total": asdict(total),
+            "stages": {stage: asdict(stats) for stage, stats in stages.items()},
+            "sections": {section: {"total": asdict(r["total"]), "stages": r["stages"]}
+                         for section, r in sections.items()},
+            "slowest_files": [{"path": path, "section": section, "stage": stage, "wall": wall}
+                              for wall, section, stage, path in sorted(self.files, reverse=True)]
+        }
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def summary(self) -> str:
+        """the report as a table"""
+        mib = 1024 * 1024
+        row_fmt = "{:<20} {:<24} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9}"
+        lines = [row_fmt.format("section", "stage", "files", "wall (s)", "cpu (s)",
+                                "peak MiB", "read MiB", "wrote MiB")]
+
+        def row(section, stage, stats):
+            lines.append(row_fmt.format(
+                section[:20], stage[:24], stats["files"], "{:.3f}".format(stats["wall"]),
+                "{:.3f}".format(stats["cpu"]), "{:.1f}".format(stats["peak_memory"] / mib),
+                "{:.1f}".format(stats["read_bytes"] / mib),
+                "{:.1f}".format(stats["written_bytes"] / mib)
+            ))
+
+        report = self.report()
+        for section, sec_report in report["sections"].items():
+            for stage, stats in sorted(sec_report["stages"].items(),
+                                       key=lambda item: -item[1]["wall"]):
+                row(section, stage, stats)
+        for stage, stats in sorted(report["stages"].items(), key=lambda item: -item[1]["wall"]):
+            row("(all)", stage, stats)
+        row("(all)", "(all)", report["total"])
+        if report["slowest_files"]:
+            lines.append("")
+            lines.append("Slowest files:")
+            for record in report["slowest_files"]:
+                lines.append("{:>9.3f}s  {:<12} {}".format(record["wall"], record["stage"],
+                                                         record["path"]))
+        return "\n".join(lines)
+
+
+# The profiler of the running 'generator' call, if it's asked to profile
+_profiler: Optional[Profiler] = None
+
+
+def profiled(sec: "SecSpec", stage: str, path: Optional[str] = None):
+    """'Profiler.stage' of the active profiler (if any) for 'sec'"""
+    if _profiler is None:
+        return nullcontext()
+    return _profiler.stage(sec.name, stage, path)
+
+
+def add_profiled_file(sec: "SecSpec", stage: str, path: str, wall: float, cpu: float):
+    """'Profiler.add_file' of the active profiler (if any) for 'sec'"""
+    if _profiler is not None:
+        _profiler.add_file(sec.name, stage, path, wall, cpu)
+
+
+# File Inventory
+
+
+@define
+class FileInventory:
+    """An in-memory picture of the directory trees a section works on, so
+    its stages do not have to walk (and stat) the disk again and again;
+    directories are scanned lazily (with os.scandir) the first time they are
+    asked about, and the stages have to 'add' the files they write"""
+    # normalized dirpath -> (dirnames, {filename: stat_result or None},
+    # names of the dirnames that are symlinks)
+    _dirs: Dict[str, Tuple[List[str], Dict[str, Optional[os.stat_result]], set]] = field(
+        init=False, factory=dict)
+
+    def _entry(self, path: str):
+        path = osp.normpath(path)
+        entry = self._dirs.get(path)
+        if entry is None:
+            dirnames, files, links = [], {}, set()
+            try:
+                with os.scandir(path) as it:
+                    for e in it:
+                        # Like os.walk, symlinks to directories are listed
+                        # as directories (but not walked into)
+                        if e.is_dir():
+                            dirnames.append(e.name)
+                            if e.is_symlink():
+                                links.add(e.name)
+                        else:
+                            files[e.name] = None  # stat lazily
+            except (FileNotFoundError, NotADirectoryError):
+                return None
+            entry = self._dirs[path] = (dirnames, files, links)
+        return entry
+
+    def walk(self, top: str):
+        """like os.walk (top-down, without following symlinks)"""
+        entry = self._entry(top)
+        if entry is None:
+            return
+        dirnames, files, links = entry
+        dirnames = list(dirnames)
+        yield top, dirnames, list(files)
+        for d in dirnames:
+            if d not in links:
+                yield from self.walk(osp.join(top, d))
+
+    def exists(self, path: str) -> bool:
+        entry = self._entry(osp.dirname(path) or ".")
+        if entry is None:
+            return False
+        name = osp.basename(path)
+        return name in entry[1] or name in entry[0]
+
+    def stat(self, path: str) -> os.stat_result:
+        entry = self._entry(osp.dirname(path) or ".")
+        name = osp.basename(path)
+        if entry is None or name not in entry[1]:
+            return os.stat(path)  # Let it raise FileNotFoundError, etc
+        st = entry[1][name]
+        if st is None:
+            st = entry[1][name] = os.stat(path)
+        return st
+
+    def add(self, path: str):
+        """records that 'path' has been (re)written"""
+        dirpath = osp.normpath(osp.dirname(path) or ".")
+        entry = self._dirs.get(dirpath)
+        if entry is None:
+            self._add_dir(dirpath)
+            return  # It will be scanned when it's needed
+        entry[1][osp.basename(path)] = None
+
+    def forget(self, top: str):
+        """drops what is known about 'top' and the directories under it, so
+        they are scanned again (like after something else has written to
+        them)"""
+        top = osp.normpath(top)
+        for path in [p for p in self._dirs
+                     if p == top or p.startswith(top + os.sep)]:
+            del self._dirs[path]
+        self._add_dir(top)
+
+    def _add_dir(self, path: str):
+        parent = osp.dirname(path)
+        if not parent or parent == path:
+            return
+        entry = self._dirs.get(parent)
+        if entry is None:
+            self._add_dir(parent)
+        elif osp.basename(path) not in entry[0]:
+            entry[0].append(osp.basename(path))
+
+
+# Build Manifest
+
+
+MANIFEST_VERSION = 2
+
+
+def file_hash(path: str, chunk_size: int = 1 << 16) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _stable_repr(value: Any) -> str:
+    # repr of functions contains their memory address which changes on every
+    # run; use their qualified name instead
+    if callable(value) and hasattr(value, "__qualname__"):
+        return "{}.{}".format(getattr(value, "__module__", ""), value.__qualname__)
+    return repr(value)
+
+
+def fingerprint(*parts: Any) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(_stable_repr(p).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def sec_fingerprint(sec: SecSpec, *fields: str) -> str:
+    return fingerprint(*(f + "=" + _stable_repr(getattr(sec, f)) for f in fields))
+
+
+@define
+class BuildManifest:
+    """Keeps a fingerprint of the inputs (source file, template and the
+    relevant SecSpec/Rules fields) of every generated output, so the next
+    build can skip the outputs whose inputs did not change"""
+    path: Optional[str] = None
+    # output path -> fingerprint of its inputs
+    outputs: Dict[str, str] = Factory(dict)
+    # source path -> [size, mtime_ns, sha256]; saves us rehashing files that
+    # have not been touched since the last build
+    sources: Dict[str, list] = Factory(dict)
+    # output path -> the paths of the other files it depends on (see
+    # 'SecSpec.data_dependencies')
+    dependencies: Dict[str, List[str]] = Factory(dict)
+    _hashes: Dict[str, str] = field(init=False, factory=dict)
+
+    @classmethod
+    def load(cls, path: str) -> "BuildManifest":
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return cls(path)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data.get("outputs", {}), data.get("sources", {}),
+                   data.get("dependencies", {}))
+
+    def save(self, path: Optional[str] = None):
+        path = path if path is not None else self.path
+        os.makedirs(osp.dirname(osp.abspath(path)), exist_ok=True)
+        with open(path, mode="w") as f:
+            json.dump({"version": MANIFEST_VERSION, "outputs": self.outputs,
+                       "sources": self.sources, "dependencies": self.dependencies},
+                      f, indent=0, sort_keys=True)
+
+    def source_hash(self, path: str, inventory: Optional[FileInventory] = None) -> str:
+        path = osp.normpath(path)
+        if path in self._hashes:
+            return self._hashes[path]
+        st = inventory.stat(path) if inventory is not None else os.stat(path)
+        cached = self.sources.get(path)
+        if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            h = cached[2]
+        else:
+            h = file_hash(path)
+            self.sources[path] = [st.st_size, st.st_mtime_ns, h]
+        self._hashes[path] = h
+        return h
+
+    def invalidate(self, path: str):
+        """forgets the hash of the source 'path' (like when it's changed in
+        the lifetime of this manifest)"""
+        path = osp.normpath(path)
+        self._hashes.pop(path, None)
+        self.sources.pop(path, None)
+
+    def dependencies_hash(self, dst: str, inventory: Optional[FileInventory] = None) -> list:
+        """the hashes of the dependencies of 'dst' (None for the missing ones)"""
+        exists = inventory.exists if inventory is not None else osp.exists
+        return [(path, self.source_hash(path, inventory) if exists(path) else None)
+                for path in self.dependencies.get(osp.normpath(dst), ())]
+
+    def output_key(self, dst: str) -> Optional[str]:
+        return self.outputs.get(osp.normpath(dst))
+
+    def up_to_date(self, dst: str, key: str, inventory: Optional[FileInventory] = None) -> bool:
+        return self.output_key(dst) == key and (
+            inventory.exists(dst) if inventory is not None else osp.exists(dst))
+
+    def record(self, dst: str, key: str):
+        self.outputs[osp.normpath(dst)] = key
+
+
+# Data Store
+
+
+@define
+class SecDataStore:
+    """Memoizes the data_specs extracted from the sources of a section, so
+    every stage (conversion, indexing, QR titles, custom writers) can ask
+    for them without loading and parsing the same file again; a cached
+    data_spec is dropped as soon as the size or mtime of its source changes
+    """
+    extractor: Callable[[str, str], Any]
+    # normalized source path -> (size, mtime_ns, data_spec)
+    _specs: Dict[str, Tuple[int, int, Any]] = field(init=False, factory=dict)
+    # normalized output path -> (dirpath, f) of its source
+    _sources: Dict[str, Tuple[str, str]] = field(init=False, factory=dict)
+
+    def get(self, dirpath: str, f: str) -> Any:
+        path = osp.normpath(osp.join(dirpath, f))
+        st = os.stat(path)
+        cached = self._specs.get(path)
+        if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        data = self.extractor(dirpath, f)
+        self._specs[path] = (st.st_size, st.st_mtime_ns, data)
+        return data
+
+    def put(self, dirpath: str, f: str, data: Any):
+        """caches a data_spec that is extracted somewhere else (like in a
+        worker process)"""
+        path = osp.normpath(osp.join(dirpath, f))
+        st = os.stat(path)
+        self._specs[path] = (st.st_size, st.st_mtime_ns, data)
+
+    def invalidate(self, path: Optional[str] = None):
+        if path is None:
+            self._specs.clear()
+        else:
+            self._specs.pop(osp.normpath(path), None)
+
+    def add_output(self, dst: str, dirpath: str, f: str):
+        """records that 'dst' is generated from 'f' in 'dirpath'"""
+        self._sources[osp.normpath(dst)] = (dirpath, f)
+
+    def source_of(self, dst: str) -> Optional[Tuple[str, str]]:
+        return self._sources.get(osp.normpath(dst))
+
+    def data_of(self, dst: str) -> Optional[Any]:
+        """the data_spec 'dst' is generated from, if it has a source"""
+        source = self.source_of(dst)
+        return self.get(*source) if source is not None else None
+
+
+_data_stores: Dict[str, SecDataStore] = {}
+
+
+def data_store(sec: SecSpec) -> SecDataStore:
+    """returns the (per section, shared) data store of 'sec'"""
+    store = _data_stores.get(sec.name)
+    if store is None or store.extractor is not sec.data_extractor:
+        store = _data_stores[sec.name] = SecDataStore(sec.data_extractor)
+    return store
+
+
+def extract_data(sec: SecSpec, dirpath: str, f: str) -> Any:
+    """'sec.data_extractor(dirpath, f)', but memoized"""
+    return data_store(sec).get(dirpath, f)
+
+
+# Output
+
+
+# Raw text elements (and <pre>) keep their whitespace; comments are dropped
+# except for the conditional ones
+_HTML_TOKENS = re.compile(
+    r"(?P<raw><(?P<tag>pre|textarea|script|style)\b.*?</(?P=tag)\s*>)"
+    r"|(?P<comment><!--(?!\[if).*?-->)"
+    r"|(?P<markup><!--.*?-->|<[^>]*>)",
+    re.DOTALL | re.IGNORECASE
+)
+# ASCII whitespace only; the no-break space and the zero width (non-)joiner
+# are a part of the (Persian) text
+_HTML_SPACE = re.compile(r"[ \t\n\r\f]+")
+_CSS_TOKENS = re.compile(
+    r"(?P<string>\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')"
+    r"|(?P<comment>/\*.*?\*/)",
+    re.DOTALL
+)
+_CSS_SPACE = re.compile(r"\s+")
+# Spaces around these are never significant ('+', '-' and ':' are in 'calc()'s
+# and selectors)
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+
+
+def minify_html(text: str) -> str:
+    """collapses every whitespace run of the text (and between the tags) into
+    a single space and drops the comments; the whitespace is never removed
+    altogether, so inline elements (like the spans of the front matters)
+    and the RTL text around them render exactly the same"""
+    out = []
+    # The text around a dropped comment is a single run
+    run = []
+    pos = 0
+    for m in _HTML_TOKENS.finditer(text):
+        run.append(text[pos:m.start()])
+        if m.group("comment") is None:
+            out.append(_HTML_SPACE.sub(" ", "".join(run)))
+            out.append(m.group(0))
+            run = []
+        pos = m.end()
+    run.append(text[pos:])
+    out.append(_HTML_SPACE.sub(" ", "".join(run)))
+    return "".join(out).strip()
+
+
+def _minify_css_code(code: str) -> str:
+    code = _CSS_PUNCTUATION.sub(r"\1", _CSS_SPACE.sub(" ", code))
+    return code.replace(";}", "}").replace(": ", ":")
+
+
+def minify_css(text: str) -> str:
+    """drops the comments and the insignificant whitespace; strings are kept
+    as they are"""
+    # A comment may be all that separates two tokens
+    text = _CSS_TOKENS.sub(lambda m: m.group("string") or " ", text)
+    out = []
+    pos = 0
+    for m in _CSS_TOKENS.finditer(text):
+        out.append(_minify_css_code(text[pos:m.start()]))
+        out.append(m.group(0))
+        pos = m.end()
+    out.append(_minify_css_code(text[pos:]))
+    return "".join(out).strip()
+
+
+def minifier_of(sec: SecSpec, path: str) -> Optional[Callable[[str], str]]:
+    """the minifier of the outputs like 'path' according to 'sec.rules'"""
+    ext = osp.splitext(path)[1].lower()
+    if ext == ".html" and sec.rules.minify_html:
+        return minify_html
+    if ext == ".css" and sec.rules.minify_css:
+        return minify_css
+    return None
+
+
+def temp_path(path: str) -> str:
+    """a temporary path next to 'path' (on the same filesystem, so it can be
+    moved over 'path' with 'os.replace')"""
+    return "{}.{}.tmp".format(path, os.getpid())
+
+
+@contextmanager
+def replacing(path: str) -> Iterator[str]:
+    """yields a temporary path to write the new 'path' to, and moves it over
+    'path' at the end of the block; so the readers never see half of 'path',
+    and 'path' is replaced rather than written into (it may be a hardlink to
+    a source file, see 'copy_file'); nothing is replaced if the block raises
+    (the temporary file is removed)"""
+    tmp = temp_path(path)
+    try:
+        yield tmp
+    except BaseException:
+        if osp.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+
+
+def run_jobs(fn: Callable[[Any], Any], jobs: List[Any], workers: int = 1) -> List[Any]:
+    """'[fn(job) for job in jobs]', in a pool of 'workers' processes if there
+    are more than one of them and of the jobs ('fn' and the jobs have to be
+    picklable then); the results are in order, and the first failing job
+    raises here just like it would in a serial run"""
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(fn, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    return [fn(job) for job in jobs]
+
+
+# The default number of the worker processes of the stages using 'run_jobs'
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def write_if_changed(path: str, text: str, mode: str = "w") -> bool:
+    """writes 'text' to 'path' unless the file already holds exactly that (so
+    the mtimes of the unchanged files are kept); returns whether it wrote;
+    see 'replacing'"""
+    if mode == "w":
+        try:
+            with open(path, mode="r") as f:
+                if f.read() == text:
+                    return False
+        except (FileNotFoundError, UnicodeDecodeError):
+            pass
+    with replacing(path) as tmp:
+        if "a" in mode and osp.exists(path):
+            su.copyfile(path, tmp)
+        with open(tmp, mode=mode) as f:
+            f.write(text)
+    return True
+
+
+FSYNC_POLICIES = ("never", "file", "end")
+
+
+def _write_file(path: str, text: str, mode: str = "w", fsync: bool = False) -> bool:
+    os.makedirs(osp.dirname(osp.abspath(path)), exist_ok=True)
+    written = write_if_changed(path, text, mode)
+    if written and fsync:
+        _fsync(path)
+    return written
+
+
+def _fsync(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@define
+class OutputSink:
+    """Writes the outputs (see 'write_output') in a pool of 'workers'
+    threads while the next ones are being rendered; use it as a context
+    manager, 'write_output' hands the outputs to the active sink
+
+    at most 'max_pending' writes are queued (the renderer waits for the
+    oldest one beyond that); the writes to the same path are done in order;
+    the errors are raised in the order the writes were submitted, by the
+    next 'submit' or by 'drain'; 'fsync' is one of 'FSYNC_POLICIES': "file"
+    syncs every written file right away, "end" syncs all of them on 'drain'
+
+    only the process that has entered it uses it (forked worker processes
+    write by themselves)"""
+    workers: int = 4
+    max_pending: int = 64
+    fsync: str = "never"
+    _executor: Optional[ThreadPoolExecutor] = None
+    # [(path, future)] in the order they were submitted
+    _pending: deque = Factory(deque)
+    _written: List[str] = Factory(list)
+    _pid: Optional[int] = None
+    # The sink that was active before this one is entered
+    _previous: Optional["OutputSink"] = None
+
+    def __attrs_post_init__(self):
+        if self.fsync not in FSYNC_POLICIES:
+            raise ValueError("'fsync' has to be one of {}".format(FSYNC_POLICIES))
+
+    def __enter__(self) -> "OutputSink":
+        global _output_sink
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix="OutputSink")
+        self._pid = os.getpid()
+        self._previous = _output_sink
+        _output_sink = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _output_sink
+        _output_sink = self._previous
+        try:
+            if exc_type is None:
+                self.drain()
+            else:
+                # The error that is already raised is the one to report
+                for path, future in self._pending:
+                    future.cancel()
+                self._pending.clear()
+        finally:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def active(self) -> bool:
+        return self._executor is not None and self._pid == os.getpid()
+
+    def _result(self, path: str, future: Future) -> bool:
+        written = future.result()
+        if written and self.fsync == "end":
+            self._written.append(path)
+        return written
+
+    def submit(self, path: str, text: str, mode: str = "w"):
+        path = osp.normpath(path)
+        # Collecting the finished writes (and their errors) in order
+        while self._pending and self._pending[0][1].done():
+            self._result(*self._pending.popleft())
+        while len(self._pending) >= self.max_pending:
+            self._result(*self._pending.popleft())
+        # An earlier write to the same path has to land first
+        for pending_path, future in self._pending:
+            if pending_path == path:
+                future.result()
+        self._pending.append((path, self._executor.submit(
+            _write_file, path, text, mode, self.fsync == "file"
+        )))
+
+    def drain(self):
+        """waits for all the pending writes; the outputs are on the disk
+        (and readable by the next stages) afterwards"""
+        while self._pending:
+            self._result(*self._pending.popleft())
+        if self._written:
+            for _ in self._executor.map(_fsync, self._written):
+                pass
+            self._written.clear()
+
+
+# The sink of the running 'generator' call, if it's asked to use one
+_output_sink: Optional[OutputSink] = None
+
+
+def drain_outputs():
+    """'OutputSink.drain' of the active sink, if any"""
+    if _output_sink is not None and _output_sink.active():
+        _output_sink.drain()
+
+
+def write_output(sec: SecSpec, path: str, text: str, mode: str = "w") -> Optional[bool]:
+    """writes a generated page (or stylesheet) minified according to
+    'sec.rules'; see 'write_if_changed'
+
+    if there is an active 'OutputSink', the writing is handed to it and None
+    is returned (it's not known yet whether the file is changed)"""
+    minifier = minifier_of(sec, path)
+    text = minifier(text) if minifier else text
+    if _output_sink is not None and _output_sink.active():
+        _output_sink.submit(path, text, mode)
+        return None
+    return _write_file(path, text, mode)
+
+
+def replace_if_changed(tmp: str, path: str) -> bool:
+    """moves 'tmp' to 'path' unless 'path' already holds the same contents
+    (then 'tmp' is removed); returns whether it replaced 'path'"""
+    if osp.exists(path) and filecmp.cmp(tmp, path, shallow=False):
+        os.remove(tmp)
+        return False
+    os.replace(tmp, path)
+    return True
+
+
+def write_chunks_if_changed(path: str, chunks: Iterable[str]) -> bool:
+    """'write_if_changed', but 'chunks' are written to the disk as they come
+    (so they are never held in memory all at once)"""
+    tmp = temp_path(path)
+    with open(tmp, mode="w") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    return replace_if_changed(tmp, path)
+
+
+def write_output_chunks(sec: SecSpec, path: str, chunks: Iterable[str]) -> Optional[bool]:
+    """'write_output' of a streamed page (like 'Template.generate'); the
+    minifiers need the whole page, so a page that is minified is joined
+    (only this page, not the others of its kind) and handed to 'write_output'
+    (so to the active 'OutputSink', if any)"""
+    if minifier_of(sec, path) is not None:
+        return write_output(sec, path, "".join(chunks))
+    return write_chunks_if_changed(path, chunks)
+
+
+@define
+class JSONArrayWriter:
+    """Writes a (compact) JSON array to 'path' an item at a time; use it as
+    a context manager, the file is only replaced if it's changed (see
+    'replace_if_changed')"""
+    path: str
+    _tmp: Optional[str] = None
+    _file: Any = None
+    _count: int = 0
+
+    def __enter__(self) -> "JSONArrayWriter":
+        self._tmp = temp_path(self.path)
+        self._file = open(self._tmp, mode="w")
+        self._file.write("[")
+        self._count = 0
+        return self
+
+    def add(self, item: Any):
+        """'item' is dumped as is, or as a dict if it's an attrs instance"""
+        if has(type(item)):
+            item = asdict(item)
+        self._file.write(("," if self._count else "")
+                         + json.dumps(item, ensure_ascii=False, separators=(",", ":"),
+                                      default=str))
+        self._count += 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.write("]")
+        self._file.close()
+        if exc_type is not None:
+            os.remove(self._tmp)
+        else:
+            replace_if_changed(self._tmp, self.path)
+
+
+# Templates
+
+
+_environments: Dict[Tuple[str, bool], Environment] = {}
+_bytecode_cache_dir: Optional[str] = None
+_compiled_templates_dir: Optional[str] = None
+_COMPILED_STAMP = "sources.json"
+
+
+def configure_environments(bytecode_cache_dir: Optional[str] = None,
+                           compiled_templates_dir: Optional[str] = None):
+    """'bytecode_cache_dir' keeps the compiled bytecode of the templates
+    between runs (it's checked against the template sources, so it never
+    goes stale); 'compiled_templates_dir' is where 'compile_templates' puts
+    the ahead-of-time compiled templates"""
+    global _bytecode_cache_dir, _compiled_templates_dir
+    if bytecode_cache_dir is not None:
+        os.makedirs(bytecode_cache_dir, exist_ok=True)
+    _bytecode_cache_dir = bytecode_cache_dir
+    _compiled_templates_dir = compiled_templates_dir
+    _environments.clear()
+
+
+def _compiled_templates_path(template_dir: str, autoescape: bool) -> str:
+    return osp.join(_compiled_templates_dir,
+                    fingerprint(osp.abspath(template_dir), autoescape)[:16])
+
+
+def _template_hashes(template_dir: str) -> Dict[str, str]:
+    return {
+        osp.relpath(osp.join(dirpath, f), template_dir).replace(os.sep, "/"):
+            file_hash(osp.join(dirpath, f))
+        for dirpath, dirnames, filenames in os.walk(template_dir)
+        for f in filenames
+    }
+
+
+def compile_templates(template_dir: str, autoescape: bool = False):
+    """compiles every template in 'template_dir' to python modules under
+    'compiled_templates_dir' (see 'configure_environments'); environments
+    created afterwards load them instead of parsing the templates"""
+    if _compiled_templates_dir is None:
+        raise ValueError("'compiled_templates_dir' is not configured; call "
+                         "'configure_environments' first")
+    target = _compiled_templates_path(template_dir, autoescape)
+    Environment(
+        loader=FileSystemLoader(template_dir),
+        autoescape=select_autoescape() if autoescape else False
+    ).compile_templates(target, zip=None)
+    with open(osp.join(target, _COMPILED_STAMP), mode="w") as f:
+        json.dump(_template_hashes(template_dir), f)
+    _environments.pop((osp.abspath(template_dir), autoescape), None)
+
+
+def _compiled_templates_loader(template_dir: str, autoescape: bool) -> Optional[ModuleLoader]:
+    if _compiled_templates_dir is None:
+        return None
+    target = _compiled_templates_path(template_dir, autoescape)
+    try:
+        with open(osp.join(target, _COMPILED_STAMP), "r") as f:
+            stamp = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    # Compiled templates know nothing about their sources; if any of the
+    # templates has changed since they were compiled, we ignore all of them
+    if stamp != _template_hashes(template_dir):
+        return None
+    return ModuleLoader(target)
+
+
+def get_environment(template_dir: str, autoescape: bool = False) -> Environment:
+    """returns the shared Environment of 'template_dir'; 'autoescape' is
+    False for the templates that are supposed to pass arbitrary html (coming
+    from md files) through"""
+    key = (osp.abspath(template_dir), autoescape)
+    env = _environments.get(key)
+    if env is None:
+        loader = FileSystemLoader(template_dir)
+        compiled_loader = _compiled_templates_loader(template_dir, autoescape)
+        if compiled_loader is not None:
+            loader = ChoiceLoader([compiled_loader, loader])
+        env = _environments[key] = Environment(
+            loader=loader,
+            autoescape=select_autoescape() if autoescape else False,
+            bytecode_cache=(FileSystemBytecodeCache(_bytecode_cache_dir)
+                            if _bytecode_cache_dir is not None else None)
+        )
+    return env
+
+
+def get_template(path: str, autoescape: bool = False) -> Template:
+    return get_environment(osp.dirname(path), autoescape).get_template(osp.basename(path))
+
+
+_field_names: Dict[type, frozenset] = {}
+
+
+@frozen
+class RenderContext(Mapping):
+    """A read only view of the fields of an attrs instance as a mapping, to
+    render a template with; unlike 'asdict', nothing is copied (the nested
+    instances are read by the templates through their attributes)"""
+    obj: Any
+
+    def _names(self) -> frozenset:
+        cls = type(self.obj)
+        names = _field_names.get(cls)
+        if names is None:
+            names = _field_names[cls] = frozenset(a.name for a in fields(cls))
+        return names
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._names():
+            raise KeyError(key)
+        return getattr(self.obj, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return (a.name for a in fields(type(self.obj)))
+
+    def __len__(self) -> int:
+        return len(self._names())
+
+
+def render_context(data: Any) -> Mapping:
+    """the context of a template rendering 'data' (a data_spec, or a
+    mapping already)"""
+    return RenderContext(data) if has(type(data)) else data
+
+
+def convert_file(sec: SecSpec, template: Template, dirpath: str, f: str,
+                 dst_f_path: str) -> Any:
+    """returns the extracted data_spec"""
+    data = extract_data(sec, dirpath, f)
+    if sec.custom_data_writer:
+        # Preparing directory structure if sec.dst_path is nuked
+        # ('write_output' does it by itself)
+        os.makedirs(osp.dirname(dst_f_path), exist_ok=True)
+        # A real dict; the writers may modify it, or pass it on to anything
+        # expecting one
+        sec.custom_data_writer(sec, dst_f_path, template, dict(render_context(data)))
+    else:
+        write_output(sec, dst_f_path, template.render(render_context(data)))
+    return data
+
+
+def _convert_file_worker(job):
+    # Templates can not be pickled, so every worker process gets the
+    # template from its own (shared between its jobs) environment; the
+    # times are returned for the profiler of the parent process
+    sec, dirpath, f, dst_f_path = job
+    start = time.perf_counter(), time.process_time()
+    data = convert_file(sec, get_template(sec.dst_template_path), dirpath, f, dst_f_path)
+    return data, time.perf_counter() - start[0], time.process_time() - start[1]
+
+
+# Copy
+
+
+COPY_MODES = ("copy", "hardlink", "reflink")
+_FICLONE = 0x40049409  # linux/fs.h
+
+
+def files_identical(src: str, dst: str, compare: str = "stat",
+                    inventory: Optional[FileInventory] = None) -> bool:
+    _stat = inventory.stat if inventory is not None else os.stat
+    try:
+        dst_st = _stat(dst)
+    except FileNotFoundError:
+        return False
+    src_st = _stat(src)
+    if (src_st.st_dev, src_st.st_ino) == (dst_st.st_dev, dst_st.st_ino):
+        return True  # hardlinked
+    if src_st.st_size != dst_st.st_size:
+        return False
+    if compare == "hash":
+        return file_hash(src) == file_hash(dst)
+    return src_st.st_mtime_ns == dst_st.st_mtime_ns
+
+
+def _reflink(src: str, dst: str) -> bool:
+    try:
+        import fcntl
+    except ImportError:  # Not on a unix
+        return False
+    try:
+        with open(src, "rb") as sf, open(dst, "wb") as df:
+            fcntl.ioctl(df.fileno(), _FICLONE, sf.fileno())
+    except OSError:
+        return False
+    su.copystat(src, dst)
+    return True
+
+
+def copy_file(src: str, dst: str, mode: str = "copy"):
+    """copies 'src' to 'dst' keeping its mtime (so 'files_identical' can
+    recognize it later); hardlinked files share their contents with the
+    source, so anything modifying 'dst' afterwards has to replace it (see
+    'replacing')"""
+    if mode not in COPY_MODES:
+        raise ValueError("'mode' has to be one of {}, not '{}'".format(COPY_MODES, mode))
+    # Preparing directory structure if dst is nuked
+    os.makedirs(osp.dirname(osp.abspath(dst)), exist_ok=True)
+    with replacing(dst) as tmp:
+        if mode == "hardlink":
+            try:
+                os.link(src, tmp)
+            except OSError:  # Different filesystems, or links are not supported
+                su.copy2(src, tmp)
+        elif not (mode == "reflink" and _reflink(src, tmp)):
+            su.copy2(src, tmp)
+
+
+def convert_fingerprint(sec: SecSpec, manifest: BuildManifest,
+                        inventory: Optional[FileInventory] = None) -> str:
+    """the part of the manifest keys of the converted files shared by all of
+    them; the key of a file is this and the hash of its source"""
+    return fingerprint(
+        manifest.source_hash(sec.dst_template_path, inventory),
+        sec_fingerprint(sec, "dst_template_path", "data_extractor", "data_dependencies",
+                        "custom_data_writer", "rules")
+    )
+
+
+def conversion_key(convert_fp: str, manifest: BuildManifest, src: str, dst: str,
+                   inventory: Optional[FileInventory] = None) -> str:
+    """the manifest key of the file 'dst' converted from 'src'"""
+    return fingerprint(convert_fp, manifest.source_hash(src, inventory),
+                       manifest.dependencies_hash(dst, inventory))
+
+
+def record_conversion(sec: SecSpec, manifest: BuildManifest, convert_fp: str,
+                      dirpath: str, f: str, dst: str, data: Any,
+                      inventory: Optional[FileInventory] = None):
+    """records the key of the converted file 'dst' (and its dependencies,
+    which may have changed with its source)"""
+    if sec.data_dependencies is not None:
+        manifest.dependencies[osp.normpath(dst)] = [
+            osp.normpath(path) for path in sec.data_dependencies(dirpath, f, data)
+        ]
+    manifest.record(dst, conversion_key(convert_fp, manifest, osp.join(dirpath, f), dst,
+                                        inventory))
+
+
+def copy_source(sec: SecSpec, sf: str, df: str, vp: Callable = print,
+                manifest: Optional[BuildManifest] = None,
+                inventory: Optional[FileInventory] = None):
+    """copies (or minifies, see 'minifier_of') the source 'sf' to 'df'"""
+    with profiled(sec, "copy", df):
+        inventory = inventory if inventory is not None else FileInventory()
+        minifier = minifier_of(sec, sf)
+        if manifest is not None:
+            key = fingerprint("copy", manifest.source_hash(sf, inventory),
+                              minifier and minifier.__name__)
+            if manifest.up_to_date(df, key, inventory):
+                vp(f"'{df}' is up to date; skipping")
+                return
+        if minifier is not None:
+            vp(f"Minifying '{sf}' to '{df}'")
+            os.makedirs(osp.dirname(df), exist_ok=True)
+            with open(sf, mode="r") as sf_f:
+                write_output(sec, df, sf_f.read())
+            inventory.add(df)
+        elif files_identical(sf, df, sec.rules.copy_compare, inventory):
+            vp(f"'{df}' is identical to '{sf}'; skipping")
+        else:
+            vp(f"Copying '{sf}' to '{df}'")
+            copy_file(sf, df, sec.rules.copy_mode)
+            inventory.add(df)
+        if manifest is not None:
+            manifest.record(df, key)
+
+
 def content_generator(sec: SecSpec, exceptions: Iterable[str] = CE,
-                      verbose: bool = False, _nuke_warning: bool = True):
+                      verbose: bool = False, _nuke_warning: bool = True,
+                      manifest: Optional[BuildManifest] = None, workers: int = 1,
+                      inventory: Optional[FileInventory] = None):
+    """if 'workers' is more than 1, the conversions (extract, render and
+    write) will be done by a pool of 'workers' processes; in that case
+    'sec.data_extractor' and 'sec.custom_data_writer' have to be picklable
+    (module level functions are)
+
+    the source of every converted file (even the ones that were up to date)
+    is recorded in the data store of the section (see 'data_store')"""
     if _nuke_warning and sec.rules.nuke_dst_path:
         _vpg(True, "[! WARNING !]")("'sec.rules.nuke_dst_path' is set to True "
               "and it seems like you are running 'content_generator' directly"
@@ -159,178 +1351,447 @@ def content_generator(sec: SecSpec, exceptions: Iterable[str] = CE,
     if sec.custom_data_generator is not None:
         vp("'sec.custom_data_generator' is not None, delegating content generation to it")
         return sec.custom_data_generator(sec, exceptions)
-    exceptions = re_collection_compiler(exceptions)
+    inventory = inventory if inventory is not None else FileInventory()
+    exceptions = compile_selectors(exceptions)
     if sec.rules.convert_selected_data and not (sec.data_extractor or sec.dst_template_path):
         vp("WARNING: 'sec.rules.convert_selected_data' is True but one of "
            "'sec.data_extractor' or 'sec.dst_template_path' is not provided, "
            "convertion needs both of these values to be provided with "
            "appropriate types")
     convert = sec.rules.convert_selected_data and sec.data_extractor and sec.dst_template_path
-    convert_selectors = re_collection_compiler(sec.rules.convert_selectors)
     if convert:
-        template = Environment(
-            loader=FileSystemLoader(osp.dirname(sec.dst_template_path)),
-            autoescape=False  # select_autoescape()  # False because we may want to use arbitrary html code in md files
-        ).get_template(osp.basename(sec.dst_template_path))
+        store = data_store(sec)
+    convert_selectors = compile_selectors(sec.rules.convert_selectors)
+    if convert and manifest is not None:
+        convert_fp = convert_fingerprint(sec, manifest, inventory)
+    # (dirpath, f, dst_f_path, manifest key); conversions are collected while
+    # walking and done afterwards, so they can be handed to a process pool
+    conversions = []
     copy = sec.rules.copy_selected_data
-    copy_selectors = re_collection_compiler(sec.rules.copy_selectors)
-    for dirpath, dirnames, filenames in os.walk(sec.src_path):
+    copy_selectors = compile_selectors(sec.rules.copy_selectors)
+    for dirpath, dirnames, filenames in inventory.walk(sec.src_path):
         for f in filenames:
             # Convert
-            if convert and re_collection_searcher(convert_selectors, f):
+            if convert and convert_selectors(f):
                 f_base, f_ext = osp.splitext(f)
                 dst_f_path = osp.join(sec.dst_path, f_base + f_ext.replace(".md", ".html"))
-                dst_f_exists = osp.exists(dst_f_path)
-                if not re_collection_searcher(exceptions, f) and (not dst_f_exists or (
+                dst_f_exists = inventory.exists(dst_f_path)
+                if not exceptions(f) and (not dst_f_exists or (
                     dst_f_exists and sec.rules.overwrite_when_moving_converted
                 )):
-                    vp(f"Converting '{osp.join(dirpath, f)}' to '{dst_f_path}'")
-                    # Preparing directory structure if sec.dst_path is nuked
-                    os.makedirs(osp.dirname(dst_f_path), exist_ok=True)
-                    if sec.custom_data_writer:
-                        vp("using 'custom_data_writer'")
-                        sec.custom_data_writer(sec, dst_f_path, template, asdict(sec.data_extractor(dirpath, f)))
-                    else:
-                        with open(dst_f_path, mode="w") as dst_f:
-                            dst_f.write(
-                                template.render(
-                                    asdict(sec.data_extractor(dirpath, f))
-                                )
-                            )
+                    store.add_output(dst_f_path, dirpath, f)
+                    if manifest is not None:
+                        key = conversion_key(convert_fp, manifest, osp.join(dirpath, f),
+                                             dst_f_path, inventory)
+                        if manifest.up_to_date(dst_f_path, key, inventory):
+                            vp(f"'{dst_f_path}' is up to date; skipping")
+                            continue
+                    conversions.append((dirpath, f, dst_f_path))
                     # If copy and overwrite are both True, the following code
                     # would overwrite the converted file; so we have to jump
                     # to the next iteration
                     continue
             # Move
-            if copy and re_collection_searcher(copy_selectors, f):
-                dst_f_exists = osp.exists(osp.join(sec.dst_path, f))
+            if copy and copy_selectors(f):
+                # The dst of copy have to be sec.dst_path + relation of the
+                # dirpath to src_path in order to keep the directory
+                # structure (avoid flattening it)
+                sf = osp.join(dirpath, f)
+                df = osp.join(
+                    osp.join(
+                        sec.dst_path,
+                        osp.relpath(dirpath, sec.src_path)
+                    ),
+                    f
+                )
+                dst_f_exists = inventory.exists(df)
                 if not dst_f_exists or (
                     dst_f_exists and sec.rules.overwrite_when_copying
                 ):
-                    # The dst of copy have to be sec.dst_path + relation of the
-                    # dirpath to src_path in order to keep the directory
-                    # structure (avoid flattening it)
-                    sf = osp.join(dirpath, f)
-                    df = osp.join(
-                        osp.join(
-                            sec.dst_path,
-                            osp.relpath(dirpath, sec.src_path)
-                        ),
-                        f
-                    )
-                    vp(f"Copying '{sf}' to '{df}'")
-                    # Preparing directory structure if sec.dst_path is nuked
-                    os.makedirs(osp.dirname(df), exist_ok=True)
-                    su.copy(
-                        sf,
-                        osp.abspath(df)
-                    )
+                    copy_source(sec, sf, df, vp, manifest, inventory)
         if not sec.rules.recursive_convert:
             convert = False
         if not sec.rules.recursive_copy:
             copy = False
 
+    if not conversions:
+        return
+    for dirpath, f, dst_f_path in conversions:
+        vp(f"Converting '{osp.join(dirpath, f)}' to '{dst_f_path}'")
+    if sec.custom_data_writer:
+        vp("using 'custom_data_writer'")
+    if workers > 1 and len(conversions) > 1:
+        vp(f"Converting {len(conversions)} files using {workers} worker processes")
+        jobs = [(sec, dirpath, f, dst_f_path) for dirpath, f, dst_f_path in conversions]
+        results = run_jobs(_convert_file_worker, jobs, workers)
+        for (data, wall, cpu), (dirpath, f, dst_f_path) in zip(results, conversions):
+            add_profiled_file(sec, "convert", dst_f_path, wall, cpu)
+            store.put(dirpath, f, data)
+            inventory.add(dst_f_path)
+            if manifest is not None:
+                record_conversion(sec, manifest, convert_fp, dirpath, f, dst_f_path, data,
+                                  inventory)
+    else:
+        # autoescape is False because we may want to use arbitrary html code in md files
+        template = get_template(sec.dst_template_path)
+        for dirpath, f, dst_f_path in conversions:
+            with profiled(sec, "convert", dst_f_path):
+                data = convert_file(sec, template, dirpath, f, dst_f_path)
+            inventory.add(dst_f_path)
+            if manifest is not None:
+                record_conversion(sec, manifest, convert_fp, dirpath, f, dst_f_path, data,
+                                  inventory)
+
+
+@frozen
+class IndexPage:
+    """The 'pagination' of an index page (in the index template)"""
+    number: int
+    count: int
+    filename: str
+    # The filenames of the previous and the next pages, if any
+    prev: Optional[str] = None
+    next: Optional[str] = None
+
+
+def index_page_filename(filename: str, number: int) -> str:
+    """the first page is 'filename' itself, the others are like
+    'index_2.html'"""
+    if number == 1:
+        return filename
+    stem, ext = osp.splitext(filename)
+    return "{}_{}{}".format(stem, number, ext)
+
+
+def index_pages(filename: str, rows: int, page_size: Optional[int] = None) -> List[IndexPage]:
+    """the pages of an index of 'rows' rows; a single page without a
+    'page_size'"""
+    count = max(1, -(-rows // page_size)) if page_size else 1
+    return [
+        IndexPage(
+            number=i, count=count, filename=index_page_filename(filename, i),
+            prev=osp.basename(index_page_filename(filename, i - 1)) if i > 1 else None,
+            next=osp.basename(index_page_filename(filename, i + 1)) if i < count else None
+        )
+        for i in range(1, count + 1)
+    ]
+
 
 def index_generator(sec: SecSpec, exceptions: Iterable[str] = CE,
-                    verbose: bool = False):
+                    verbose: bool = False, manifest: Optional[BuildManifest] = None,
+                    inventory: Optional[FileInventory] = None):
+    """with 'sec.index_row_builder', the rows of the files generated by
+    'content_generator' are built from the data_specs they were generated
+    from (see 'data_store') instead of being extracted from the files
+
+    if 'sec.rules.onefile_index' is False, the index is split into pages of
+    'sec.rules.index_page_size' rows (see 'index_pages'); the templates get
+    the 'IndexPage' of every page as 'pagination'; with
+    'sec.index_feed_filename', the rows are written as a JSON feed too"""
     if sec.custom_index_generator:
         return sec.custom_index_generator(sec, exceptions)
-    exceptions = re_collection_compiler(exceptions)
+    inventory = inventory if inventory is not None else FileInventory()
+    exceptions = compile_selectors(exceptions)
     index = sec.generate_index
-    if verbose and index and not sec.index_template_path:
-        vp = _vpg("[index_generator]")
+    if index and not sec.index_template_path:
+        vp = _vpg(verbose, "[index_generator]")
         vp("'sec.generate_index' is True but 'sec.index_template_path' is not "
            "provided, index generation without a template is not possible; "
            "thus skipping the index generation")
         return
-    index_rows = []
-    index_selectors = re_collection_compiler(sec.rules.index_selectors)
-    for dirpath, dirnames, filenames in os.walk(sec.dst_path):
+    indexed = []
+    index_selectors = compile_selectors(sec.rules.index_selectors)
+    for dirpath, dirnames, filenames in inventory.walk(sec.dst_path):
         for f in filenames:
-            if index and (re_collection_searcher(index_selectors, f)
-            and not re_collection_searcher(exceptions, f)):
-                index_rows.append(sec.index_extractor(dirpath, f))
+            if index and (index_selectors(f)
+            and not exceptions(f)):
+                indexed.append((dirpath, f))
         if not sec.rules.recursive_index:
             index = False
+    page_size = sec.rules.index_page_size if not sec.rules.onefile_index else None
+    pages = index_pages(sec.index_filename, len(indexed), page_size)
+    index_paths = [osp.join(sec.dst_path, page.filename) for page in pages]
+    feed_path = (osp.join(sec.dst_path, sec.index_feed_filename)
+                 if sec.index_feed_filename else None)
+    if manifest is not None:
+        # Indexed files that are generated by us already have a fingerprint
+        # of their inputs, there is no need to hash them again
+        key = fingerprint(
+            manifest.source_hash(sec.index_template_path, inventory),
+            sec_fingerprint(sec, "index_filename", "index_title", "index_feed_filename",
+                            "index_extractor", "index_row_builder",
+                            "custom_index_writer", "rules"),
+            [(f, manifest.output_key(osp.join(dirpath, f))
+              or manifest.source_hash(osp.join(dirpath, f), inventory))
+             for dirpath, f in sorted(indexed)]
+        )
+        if all(manifest.up_to_date(path, key, inventory)
+               for path in index_paths + ([feed_path] if feed_path else [])):
+            return
+    store = data_store(sec)
 
-    template = Environment(
-        loader=FileSystemLoader(osp.dirname(sec.index_template_path)),
-        autoescape=select_autoescape()
-    ).get_template(osp.basename(sec.index_template_path))
+    def index_rows(entries):
+        rows = []
+        for dirpath, f in entries:
+            source = store.source_of(osp.join(dirpath, f))
+            if sec.index_row_builder and source is not None:
+                rows.append(sec.index_row_builder(dirpath, f, store.get(*source)))
+            elif sec.index_extractor:
+                rows.append(sec.index_extractor(dirpath, f))
+        return rows
+
+    template = get_template(sec.index_template_path, autoescape=True)
     # Preparing directory structure if sec.dst_path is nuked if it has not
     # done already by 'content_generator' (like when if 'sec.data_extractor'
     # and 'sec.rules.copy_selected_data' are None)
     os.makedirs(sec.dst_path, exist_ok=True)
-    if sec.custom_index_writer:
-        sec.custom_index_writer(sec, template, index_rows)
-    else:
-        with open(osp.join(sec.dst_path, sec.index_filename), mode="w") as f:
-            f.write(template.render(title=sec.index_title, index=index_rows))
+    with JSONArrayWriter(feed_path) if feed_path else nullcontext() as feed:
+        if sec.custom_index_writer:
+            rows = index_rows(indexed)
+            sec.custom_index_writer(sec, template, rows)
+            if feed is not None:
+                for row in rows:
+                    feed.add(row)
+        else:
+            # Only the rows of a page are held in memory at once, and the
+            # page is streamed to the disk (or minified and written on its
+            # own, see 'write_output_chunks')
+            for page, path in zip(pages, index_paths):
+                start = (page.number - 1) * page_size if page_size else 0
+                rows = index_rows(indexed[start:start + page_size] if page_size else indexed)
+                write_output_chunks(sec, path, template.generate(
+                    title=sec.index_title, index=rows, pagination=page
+                ))
+                if feed is not None:
+                    for row in rows:
+                        feed.add(row)
+            # Removing the pages of a (previously) longer index
+            for number in itertools.count(len(pages) + 1):
+                stale = osp.join(sec.dst_path, index_page_filename(sec.index_filename, number))
+                if not osp.exists(stale):
+                    break
+                os.remove(stale)
+    for path in index_paths + ([feed_path] if feed_path else []):
+        inventory.add(path)
+        if manifest is not None:
+            manifest.record(path, key)
+
 
+# QR Codes
 
-def qr_imgs_generator(sec: SecSpec, exceptions: Iterable[str] = CE, verbose: bool = False):
+
+def make_qr_img(url: str, path: str, params: QRParams = QRParams()):
+    qrcode = qr.make(url, error_correction=params.error_correction,
+                     box_size=params.box_size, border=params.border)
+    qrcode.save(path, format=params.image_format)
+
+
+@define
+class QRCache:
+    """A content-addressed store of QR images; an image only depends on the
+    url it encodes and the QRParams it's made with, so it's made once and
+    copied (or linked) wherever it's needed afterwards"""
+    path: str
+
+    def path_of(self, url: str, params: QRParams = QRParams()) -> str:
+        key = fingerprint("qr", url, params)
+        return osp.join(self.path, key[:2], key + "." + params.image_format)
+
+    def image(self, url: str, params: QRParams = QRParams()) -> str:
+        """returns the path of the cached image of 'url', making it if needed"""
+        path = self.path_of(url, params)
+        if not osp.exists(path):
+            os.makedirs(osp.dirname(path), exist_ok=True)
+            with replacing(path) as tmp:
+                make_qr_img(url, tmp, params)
+        return path
+
+
+@lru_cache(maxsize=None)
+def qr_svg(url: str, params: QRParams = QRParams()) -> str:
+    """an inline SVG of the QR code of 'url'; the dark modules of each row are
+    merged into runs of a single path, the 'params.box_size' only sets the
+    intrinsic size (as it does for the QR images)"""
+    code = qr.QRCode(error_correction=params.error_correction,
+                     box_size=params.box_size, border=params.border)
+    code.add_data(url)
+    code.make(fit=True)
+    matrix = code.get_matrix()  # The border is included
+    size = len(matrix)
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if row[x]:
+                start = x
+                while x < size and row[x]:
+                    x += 1
+                path.append("M{},{}h{}v1h-{}z".format(start, y, x - start, x - start))
+            else:
+                x += 1
+    return (
+        '<svg class="qr-code-img" xmlns="http://www.w3.org/2000/svg" '
+        'width="{px}" height="{px}" viewBox="0 0 {n} {n}" shape-rendering="crispEdges">'
+        '<rect width="{n}" height="{n}" fill="#fff"/><path d="{d}"/></svg>'
+    ).format(px=size * params.box_size, n=size, d="".join(path))
+
+
+def qr_svgs(sec: SecSpec, table: qr_table_type) -> Dict[str, str]:
+    """the inline SVGs of the QR codes in 'table' for the QR Pages templates
+    (as 'qr_svgs'); empty if 'sec.qrpages_inline_svg' is False"""
+    if not sec.qrpages_inline_svg or not sec.url_prefix:
+        return {}
+    return {qr_code: qr_svg(sec.url_prefix + qr_code, sec.qr_params)
+            for row in table for qr_code in row}
+
+
+def qr_imgs_generator(sec: SecSpec, exceptions: Iterable[str] = CE, verbose: bool = False,
+                      manifest: Optional[BuildManifest] = None,
+                      inventory: Optional[FileInventory] = None,
+                      qr_cache: Optional[QRCache] = None,
+                      only: Optional[Collection[str]] = None):
+    """with 'only', only the QR images of those QR codes (the basenames of
+    their pages) are generated"""
     vp = _vpg(verbose, "[qr_imgs_generator]")
     if not sec.url_prefix:
         vp("'qr_imgs' is True but 'sec.url_prefix' is not provided; skipping "
            "QR Image generation")
         return
-    exceptions = re_collection_compiler(exceptions)
-    for dirpath, dirnames, filenames in os.walk(sec.dst_path):
-        for f in filenames:
-            if f.endswith(".html"):
-                if re_collection_searcher(exceptions, f):
+    inventory = inventory if inventory is not None else FileInventory()
+    exceptions = compile_selectors(exceptions)
+    # Listing the pages first; we are about to add the QR images to the tree
+    pages = [f for dirpath, dirnames, filenames in inventory.walk(sec.dst_path)
+             for f in filenames]
+    for f in pages:
+        if f.endswith(".html"):
+            if exceptions(f):
+                continue
+            f = osp.splitext(f)[0]
+            if only is not None and f not in only:
+                continue
+            qr_dirpath = osp.join(sec.dst_path, sec.qr_dirname)
+            qr_path = osp.join(qr_dirpath, f + "." + sec.qr_params.image_format)
+            if manifest is not None:
+                # A QR code only depends on the url it encodes
+                key = fingerprint("qr", sec.url_prefix + f, sec.qr_params)
+                if manifest.up_to_date(qr_path, key, inventory):
                     continue
-                f = osp.splitext(f)[0]
-                vp("Generating QR Image for", sec.url_prefix + f)
-                qrcode = qr.make(sec.url_prefix + f)
-                # Preparing directory structure if sec.dst_path is nuked
-                qr_dirpath = osp.join(sec.dst_path, sec.qr_dirname)
-                os.makedirs(qr_dirpath, exist_ok=True)
-                # print("[!!!]", osp.join(osp.join(sec.output_path, sec.qr_dirname), f + ".png"))
-                qrcode.save(osp.join(qr_dirpath, f + ".png"))
+            # Preparing directory structure if sec.dst_path is nuked
+            os.makedirs(qr_dirpath, exist_ok=True)
+            with profiled(sec, "qr_images", qr_path):
+                if qr_cache is not None:
+                    cached = qr_cache.image(sec.url_prefix + f, sec.qr_params)
+                    if files_identical(cached, qr_path, inventory=inventory):
+                        vp(f"'{qr_path}' is identical to '{cached}'; skipping")
+                    else:
+                        vp("Copying the QR Image of", sec.url_prefix + f, "from", cached)
+                        copy_file(cached, qr_path, sec.rules.copy_mode)
+                else:
+                    vp("Generating QR Image for", sec.url_prefix + f)
+                    make_qr_img(sec.url_prefix + f, qr_path, sec.qr_params)
+            inventory.add(qr_path)
+            if manifest is not None:
+                manifest.record(qr_path, key)
+
+
+def paginate_qr_codes(qr_codes: Iterable[str], rows: int = 5, cols: int = 4,
+                      slots: Optional[Dict[str, int]] = None) -> Iterator[qr_table_type]:
+    """lays 'qr_codes' out in sorted order on pages of 'rows' x 'cols' and
+    yields the pages (tables) one by one; 'slots' ({qr_code: slot}) pins the
+    codes to their slots (slot = page * rows * cols + row * cols + col), the
+    other codes fill the free slots in order; 'slots' is updated in place"""
+    per_page = rows * cols
+    qr_codes = sorted(set(qr_codes))
+    slots = slots if slots is not None else {}
+    # Forgetting the removed codes frees their slots for the new ones
+    for qr_code in set(slots).difference(qr_codes):
+        del slots[qr_code]
+    taken = set(slots.values())
+    free = (slot for slot in itertools.count() if slot not in taken)
+    for qr_code in qr_codes:
+        if qr_code not in slots:
+            slots[qr_code] = next(free)
+    by_slot = {slot: qr_code for qr_code, slot in slots.items()}
+    for page in range(max(by_slot) // per_page + 1 if by_slot else 0):
+        table = []
+        for row in range(rows):
+            first = page * per_page + row * cols
+            table_row = [by_slot[slot] for slot in range(first, first + cols) if slot in by_slot]
+            if table_row:
+                table.append(table_row)
+        yield table
+
+
+def load_qr_slots(path: str, rows: int, cols: int) -> Dict[str, int]:
+    """the pinned slots in the QR layout file at 'path'; empty if there is no
+    such file or it was made for pages of another size"""
+    try:
+        with open(path, "r") as f:
+            layout = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if (layout.get("rows"), layout.get("cols")) != (rows, cols):
+        return {}
+    return layout.get("slots", {})
+
+
+def save_qr_slots(path: str, rows: int, cols: int, slots: Dict[str, int]):
+    os.makedirs(osp.dirname(osp.abspath(path)), exist_ok=True)
+    write_if_changed(path, json.dumps({"rows": rows, "cols": cols, "slots": slots},
+                                      indent=0, sort_keys=True, ensure_ascii=False))
+
+
+# The hex digest suffix of a content addressed copy of a file
+_COPY_SUFFIX = re.compile(r"\.[0-9a-f]{8,64}$")
+
+
+def iter_qr_pages(sec: SecSpec, rows: int = 5, cols: int = 4,
+                  exceptions: Iterable[str] = (r"index\.png", ),
+                  inventory: Optional[FileInventory] = None) -> Iterator[qr_table_type]:
+    """yields the QR Pages (tables of QR code names) of 'sec' in a stable
+    order; with 'sec.qrpages_layout_path' the codes keep their slots across
+    builds, so adding (or removing) a code only changes the page it's on"""
+    inventory = inventory if inventory is not None else FileInventory()
+    exceptions = compile_selectors(exceptions)
+    # The QR images may not be there when the QR codes are inline SVGs, so
+    # the pages are listed instead (like 'qr_imgs_generator' does)
+    if sec.qrpages_inline_svg:
+        top, ext = sec.dst_path, ".html"
+    else:
+        top, ext = osp.join(sec.dst_path, sec.qr_dirname), "." + sec.qr_params.image_format
+    qr_codes = [osp.splitext(f)[0]
+                for dirpath, dirnames, filenames in inventory.walk(top)
+                for f in filenames if f.endswith(ext) and not exceptions(f)]
+    # Leaving out the copies of the codes (like 'code.0123456789.png' of the
+    # asset fingerprinting post generators) next to them
+    names = set(qr_codes)
+    qr_codes = [c for c in qr_codes if not (
+        _COPY_SUFFIX.search(c) and _COPY_SUFFIX.sub("", c) in names
+    )]
+    if not sec.qrpages_layout_path:
+        yield from paginate_qr_codes(qr_codes, rows, cols)
+        return
+    slots = load_qr_slots(sec.qrpages_layout_path, rows, cols)
+    pages = paginate_qr_codes(qr_codes, rows, cols, slots)
+    # 'slots' is complete once the first page is laid out
+    first = next(pages, None)
+    save_qr_slots(sec.qrpages_layout_path, rows, cols, slots)
+    if first is not None:
+        yield first
+        yield from pages
 
 
 def qr_pages_extractor(sec: SecSpec, rows: int = 5, cols: int = 4,
-                      #  qr_name_attribute: str = "header",
-                       exceptions: Iterable[str] = (r"index\.png", )) -> qr_pages_type:
-    # """if 'qr_name_attribute' is set to ""; the file basenames will be used
-    # for each qr name in the tables, otherwise, the 'sec.data_extractor' will
-    # be called on the src file to extract the DataSpec and 'qr_name_attribute'
-    # of the resulting DataSpec will be used as qr names (to give a better name)"""
-    exceptions = re_collection_compiler(exceptions)
-    pages: qr_pages_type = []
-    for dirpath, dirnames, filenames in os.walk(osp.join(sec.dst_path, sec.qr_dirname)):
-        for f in filenames:
-            if f.endswith(".png"):
-                if re_collection_searcher(exceptions, f):
-                    continue
-                if len(pages) == 0 or (len(pages[-1]) >= rows and len(pages[-1][-1]) >= cols):
-                    pages.append([])
-                table = pages[-1]
-                # print("[$$$]", f, table)
-                table_len = len(table)
-                if table_len <= rows:
-                    if (table_len == 0 or len(table[-1]) >= cols) and table_len + 1 <= rows:
-                        table.append([])
-                    if len(table[-1]) < cols:
-                        qr_basename = osp.splitext(osp.basename(f))[0]
-                        table[-1].append(qr_basename)
-                        # if qr_name_attribute:
-                        #     table[-1].append(
-                        #         asdict(
-                        #             sec.data_extractor(
-                        #                 dirpath=sec.src_path,
-                        #                 f=qr_basename + ".md"
-                        #             )
-                        #         )[qr_name_attribute]
-                        #     )
-    return pages
+                       exceptions: Iterable[str] = (r"index\.png", ),
+                       inventory: Optional[FileInventory] = None) -> qr_pages_type:
+    return list(iter_qr_pages(sec, rows, cols, exceptions, inventory))
 
 
 def qr_table_writer(sec: SecSpec, table: qr_table_type, template: Template,
                     path: str, mode: str = "w", title: str = "QR Codes"):
-    with open(path, mode=mode) as f:
-        f.write(template.render(title=title, table=table, enumerate=enumerate, len=len))
+    return write_output(sec, path, template.render(title=title, table=table,
+                                                   qr_svgs=qr_svgs(sec, table),
+                                                   enumerate=enumerate, len=len), mode)
 
 
 
@@ -341,39 +1802,87 @@ def qr_pages_generator(
     cols: int = 4,
     filename_fmt: str = "qr_codes_{i}.html",
     title_fmt: str = "QR Codes {i}",
-    verbose: bool = True
+    verbose: bool = True,
+    manifest: Optional[BuildManifest] = None,
+    inventory: Optional[FileInventory] = None,
+    only: Optional[Collection[str]] = None
 ):
+    """with 'only', only the pages having any of those QR codes are written"""
     vp = _vpg(verbose, "[qr_pages_generator]")
     if not sec.qrpages_template_path:
         vp("'sec.qrpages_template_path' is not provided; skipping the QR "
            "Pages generation")
         return
+    inventory = inventory if inventory is not None else FileInventory()
     if sec.custom_qrpages_extractor:
         pages = sec.custom_qrpages_extractor(sec, rows, cols, exceptions)
         vp("Using 'sec.custom_qrpages_extractor'")
     else:
-        pages = qr_pages_extractor(sec, rows, cols, exceptions)
+        # The pages are laid out and written one at a time
+        pages = iter_qr_pages(sec, rows, cols, exceptions, inventory)
     # print(qr_pages_rows, qr_pages_cols)
     # pprint(pages)
 
-    template = Environment(
-        loader=FileSystemLoader(osp.dirname(sec.qrpages_template_path)),
-        autoescape=False  # select_autoescape()  # We want to preserve html tags (for specifying fonts, etc)
-    ).get_template(osp.split(sec.qrpages_template_path)[1])
-    for i, table in enumerate(pages, start=1):
-        dst_path = osp.join(
-            osp.join(sec.dst_path, sec.qrpages_dirname),
-            filename_fmt.format(i=i)
+    # autoescape is False because we want to preserve html tags (for specifying fonts, etc)
+    template = get_template(sec.qrpages_template_path)
+    if manifest is not None:
+        pages_fp = fingerprint(
+            manifest.source_hash(sec.qrpages_template_path, inventory),
+            sec_fingerprint(sec, "url_prefix", "custom_qr_table_writer", "qr_params",
+                            "qrpages_inline_svg")
         )
-        vp("Writing QR Page: '{}'".format(dst_path))
+    pages_dirpath = osp.join(sec.dst_path, sec.qrpages_dirname)
+    # The pages in the current layout
+    laid_out = set()
+    for i, table in enumerate(pages, start=1):
+        dst_path = osp.join(pages_dirpath, filename_fmt.format(i=i))
+        if not table:
+            # All the codes pinned to this page are gone; the page numbers of
+            # the next ones are kept
+            vp("QR Page '{}' is empty; skipping".format(dst_path))
+            continue
+        laid_out.add(filename_fmt.format(i=i))
+        if only is not None and not any(qr_code in only for row in table for qr_code in row):
+            continue
+        if manifest is not None:
+            # Custom table writers may read the pages of the QR codes (to use
+            # their headers as QR names, etc); so they are a part of the key
+            key = fingerprint(
+                pages_fp, title_fmt.format(i=i), table,
+                [manifest.output_key(osp.join(sec.dst_path, qr_code + ".html"))
+                 for row in table for qr_code in row]
+            )
+            if manifest.up_to_date(dst_path, key, inventory):
+                continue
         # Preparing directory structure if sec.dst_path is nuked
         os.makedirs(osp.dirname(dst_path), exist_ok=True)
-        if sec.custom_qr_table_writer:
-            sec.custom_qr_table_writer(sec, table, template, dst_path,
-                                       title=title_fmt.format(i=i))
+        with profiled(sec, "qr_pages", dst_path):
+            if sec.custom_qr_table_writer:
+                written = sec.custom_qr_table_writer(sec, table, template, dst_path,
+                                                     title=title_fmt.format(i=i))
+            else:
+                written = qr_table_writer(sec, table, template, dst_path,
+                                          title=title_fmt.format(i=i))
+        # Custom writers may not report it
+        if written is False:
+            vp("QR Page '{}' is unchanged".format(dst_path))
         else:
-            qr_table_writer(sec, table, template, dst_path,
-                            title=title_fmt.format(i=i))
+            vp("Wrote QR Page: '{}'".format(dst_path))
+        inventory.add(dst_path)
+        if manifest is not None:
+            manifest.record(dst_path, key)
+    if only is None and osp.isdir(pages_dirpath):
+        # Removing the pages which are not in the layout anymore (the emptied
+        # ones, and the ones after the last page)
+        page_name = re.compile("^{}$".format(
+            re.escape(filename_fmt).replace(re.escape("{i}"), r"\d+")))
+        stale = [f for f in os.listdir(pages_dirpath)
+                 if page_name.match(f) and f not in laid_out]
+        for f in stale:
+            vp("Removing the QR Page '{}'".format(osp.join(pages_dirpath, f)))
+            os.remove(osp.join(pages_dirpath, f))
+        if stale:
+            inventory.forget(pages_dirpath)
 
 
 def qr_generator(
@@ -387,39 +1896,58 @@ def qr_generator(
     qr_pages_filename_fmt: str = "qr_codes_{i}.html",
     qr_pages_title_fmt: str = "QR Codes {i}",
     verbose: bool = False,
+    manifest: Optional[BuildManifest] = None,
+    inventory: Optional[FileInventory] = None,
+    qr_cache: Optional[QRCache] = None
 ):
     vp = _vpg(verbose, "[qr_generator]")
     if sec.custom_qr_generator:
         vp("Using 'sec.custom_qr_generator'")
-        return sec.custom_qr_generator(
-            sec,
-            qr_imgs_exceptions,
-            qr_pages,
-            qr_pages_exceptions,
-            qr_pages_rows,
-            qr_pages_cols,
-            qr_pages_filename_fmt,
-            qr_pages_title_fmt,
-            verbose
-        )
+        with profiled(sec, "qr"):
+            result = sec.custom_qr_generator(
+                sec,
+                qr_imgs_exceptions,
+                qr_pages,
+                qr_pages_exceptions,
+                qr_pages_rows,
+                qr_pages_cols,
+                qr_pages_filename_fmt,
+                qr_pages_title_fmt,
+                verbose
+            )
+            drain_outputs()
+            if inventory is not None:
+                # It has written to the disk behind the inventory's back
+                inventory.forget(osp.join(sec.dst_path, sec.qr_dirname))
+            return result
     vp("Generating QR Images")
     if qr_imgs and sec.url_prefix:
-        if sec.custom_qr_img_generator:
-            vp("Using 'sec.custom_qr_img_generator'")
-            sec.custom_qr_img_generator(sec, qr_imgs_exceptions, verbose)
-        else:
-            qr_imgs_generator(sec, qr_imgs_exceptions, verbose)
+        with profiled(sec, "qr_images"):
+            if sec.custom_qr_img_generator:
+                vp("Using 'sec.custom_qr_img_generator'")
+                sec.custom_qr_img_generator(sec, qr_imgs_exceptions, verbose)
+                if inventory is not None:
+                    # It has written the images behind the inventory's back
+                    inventory.forget(osp.join(sec.dst_path, sec.qr_dirname))
+            else:
+                qr_imgs_generator(sec, qr_imgs_exceptions, verbose, manifest=manifest,
+                                  inventory=inventory, qr_cache=qr_cache)
+            drain_outputs()
     vp("Generating QR Pages")
     if qr_pages:
-        qr_pages_generator(
-            sec,
-            qr_pages_exceptions,
-            qr_pages_rows,
-            qr_pages_cols,
-            qr_pages_filename_fmt,
-            qr_pages_title_fmt,
-            verbose
-        )
+        with profiled(sec, "qr_pages"):
+            qr_pages_generator(
+                sec,
+                qr_pages_exceptions,
+                qr_pages_rows,
+                qr_pages_cols,
+                qr_pages_filename_fmt,
+                qr_pages_title_fmt,
+                verbose,
+                manifest=manifest,
+                inventory=inventory
+            )
+            drain_outputs()
 
 
 def nuke_handler(sec: SecSpec):
@@ -449,8 +1977,47 @@ def generator(sec: SecSpec, content_exceptions: Iterable[str] = CE,
               qr_pages_rows: int = 5, qr_pages_cols: int = 4,
               qr_pages_filename_fmt: str = "qr_codes_{i}.html",
               qr_pages_title_fmt: str = "QR Codes {i}", verbose: bool = False,
-              args_pass_through: bool = True):
+              args_pass_through: bool = True, manifest_path: Optional[str] = None,
+              workers: int = 1, qr_cache_path: Optional[str] = None,
+              profile: Optional[str] = None, output_workers: int = 0,
+              output_fsync: str = "never", _manifest: Optional[BuildManifest] = None):
+    """with 'profile', the time, memory and I/O of every stage of every
+    section is recorded (see 'Profiler'), saved as a JSON report to the
+    'profile' path and printed as a table; tracing the memory makes the
+    build quite slower
+
+    if 'output_workers' is more than 0, the outputs are written by a pool of
+    that many threads while the next ones are rendered (see 'OutputSink',
+    'output_fsync' is its 'fsync'); every stage waits for its outputs to be
+    written before the next one starts"""
+    global _profiler
+    # For calling itself with the same arguments
+    args = dict(locals())
+    if profile is not None and _profiler is None:
+        _profiler = Profiler()
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        try:
+            generator(**dict(args, profile=None))
+        finally:
+            profiler, _profiler = _profiler, None
+            if not tracing:
+                tracemalloc.stop()
+        profiler.save(profile)
+        print(profiler.summary())
+        return
+    if output_workers > 0 and (_output_sink is None or not _output_sink.active()):
+        with OutputSink(workers=output_workers, fsync=output_fsync):
+            generator(**dict(args, output_workers=0))
+        return
     vp = _vpg(verbose, "[generator]")
+    # The manifest is loaded once by the outermost call and shared with the
+    # sub_secs, so it has to be saved only once after all of them are done
+    manifest = _manifest
+    if manifest is None and manifest_path is not None:
+        vp("Loading the build manifest from '{}'".format(manifest_path))
+        manifest = BuildManifest.load(manifest_path)
     vp("Beginning with section {} ({})".format(sec.name, sec.url_prefix))
     if sec.rules.nuke_dst_path:
         nuke_handler(sec)
@@ -458,19 +2025,32 @@ def generator(sec: SecSpec, content_exceptions: Iterable[str] = CE,
         if sec.data_extractor is None:
             vp("'sec.data_extractor' is None, 'content_generator' will only"
                "copy data according to 'sec.rules' ({})".format(sec.rules))
-        content_generator(sec, exceptions=content_exceptions, verbose=verbose, _nuke_warning=False)
+        # Shared by all the stages of this section
+        inventory = FileInventory()
+        with profiled(sec, "convert"):
+            content_generator(sec, exceptions=content_exceptions, verbose=verbose,
+                              _nuke_warning=False, manifest=manifest, workers=workers,
+                              inventory=inventory)
+            drain_outputs()
 
-        if index and sec.generate_index and sec.index_extractor is not None:
+        if index and sec.generate_index and (sec.index_extractor is not None
+                                             or sec.index_row_builder is not None):
             vp("'sec.data_extractor' is provided; generating content")
-            index_generator(sec, exceptions=index_exceptions, verbose=verbose)
+            with profiled(sec, "index"):
+                index_generator(sec, exceptions=index_exceptions, verbose=verbose,
+                                manifest=manifest, inventory=inventory)
+                drain_outputs()
         else:
-            vp("'index' is False or 'sec.index_extractor' is None; skipping index generation")
+            vp("'index' is False or both 'sec.index_extractor' and "
+               "'sec.index_row_builder' are None; skipping index generation")
 
         if qr and sec.generate_qr:
             vp("Generating QR Codes")
             qr_generator(sec, qr_imgs, qr_imgs_exceptions, qr_pages,
                                qr_pages_exceptions, qr_pages_rows, qr_pages_cols,
-                               qr_pages_filename_fmt, qr_pages_title_fmt, verbose=verbose)
+                               qr_pages_filename_fmt, qr_pages_title_fmt, verbose=verbose,
+                               manifest=manifest, inventory=inventory,
+                               qr_cache=QRCache(qr_cache_path) if qr_cache_path else None)
         else:
             vp("'qr' is False; skipping QR Codes generation")
     else:
@@ -485,9 +2065,202 @@ def generator(sec: SecSpec, content_exceptions: Iterable[str] = CE,
                       qr_pages_rows=qr_pages_rows, qr_pages_cols=qr_pages_cols,
                       qr_pages_filename_fmt=qr_pages_filename_fmt,
                       qr_pages_title_fmt=qr_pages_title_fmt, verbose=verbose,
-                      args_pass_through=args_pass_through)
+                      args_pass_through=args_pass_through, workers=workers,
+                      qr_cache_path=qr_cache_path, _manifest=manifest)
         else:
-            generator(s)
+            generator(s, _manifest=manifest)
+    for post_generator in sec.post_generators:
+        vp("Running the post generator {!r}".format(post_generator))
+        with profiled(sec, "post:" + type(post_generator).__name__):
+            post_generator(sec, verbose)
+            drain_outputs()
+    if _manifest is None and manifest is not None:
+        vp("Saving the build manifest to '{}'".format(manifest.path))
+        manifest.save()
+
+
+def _owners_of(sec: SecSpec, path: str) -> List[SecSpec]:
+    """'sec' and its sub_secs down to the innermost one having 'path' in its
+    'src_path' (empty, if none of them has it)"""
+    for s in sec.sub_secs:
+        owners = _owners_of(s, path)
+        if owners:
+            return [sec] + owners
+    if sec.src_path is not None and sec.dst_path is not None:
+        src_path = osp.abspath(sec.src_path)
+        if osp.commonpath([src_path, osp.abspath(path)]) == src_path:
+            return [sec]
+    return []
+
+
+def _sec_of_output(sec: SecSpec, dst: str) -> Optional[SecSpec]:
+    """the innermost of 'sec' and its sub_secs having 'dst' in its 'dst_path'"""
+    for s in sec.sub_secs:
+        found = _sec_of_output(s, dst)
+        if found is not None:
+            return found
+    if sec.src_path is not None and sec.dst_path is not None:
+        dst_path = osp.abspath(sec.dst_path)
+        if osp.commonpath([dst_path, osp.abspath(dst)]) == dst_path:
+            return sec
+    return None
+
+
+def _record_outputs(sec: SecSpec, inventory: FileInventory, convert_selectors: Callable,
+                    exceptions: Callable):
+    """records the sources of all the converted files of 'sec' in its data
+    store (see 'SecDataStore.add_output')"""
+    store = data_store(sec)
+    for src_dirpath, dirnames, filenames in inventory.walk(sec.src_path):
+        for g in filenames:
+            if convert_selectors(g) and not exceptions(g):
+                store.add_output(osp.join(sec.dst_path, osp.splitext(g)[0] + ".html"),
+                                 src_dirpath, g)
+
+
+# The arguments of 'generator' which 'rebuild' has nothing to do with
+_REBUILD_IGNORED_ARGS = frozenset((
+    "args_pass_through", "manifest_path", "workers", "qr_cache_path", "profile",
+    "output_workers", "output_fsync",
+))
+
+
+def rebuild(sec: SecSpec, path: str, content_exceptions: Iterable[str] = CE,
+            index: bool = True, index_exceptions: Iterable[str] = CE,
+            qr: bool = True, qr_imgs: bool = True, qr_imgs_exceptions: Iterable[str] = CE,
+            qr_pages: bool = True, qr_pages_exceptions: Iterable[str] = CE,
+            qr_pages_rows: int = 5, qr_pages_cols: int = 4,
+            qr_pages_filename_fmt: str = "qr_codes_{i}.html",
+            qr_pages_title_fmt: str = "QR Codes {i}", verbose: bool = False,
+            manifest: Optional[BuildManifest] = None, qr_cache: Optional[QRCache] = None,
+            post: bool = True, _dependents: bool = True, **kwargs) -> bool:
+    """regenerates only what depends on the source file 'path' (of 'sec' or
+    any of its sub_secs): its page (or copy), the index of its section and
+    its QR image and QR page; with 'manifest', the pages depending on 'path'
+    (see 'SecSpec.data_dependencies') are converted again too; the arguments
+    are the ones of 'generator' (the ones it has nothing to do with are
+    ignored, so the same ones can be passed to both) and have to be the same
+    as the ones of the last 'generator' call to get the same results; if
+    'post' is True, the post generators of the section of 'path' and the
+    ones above it are run afterwards too
+
+    returns False if 'path' is neither a source of any of the sections nor a
+    dependency of their pages"""
+    unknown = set(kwargs) - _REBUILD_IGNORED_ARGS
+    if unknown:
+        raise TypeError("rebuild() got unexpected keyword arguments: {}".format(
+            ", ".join(sorted(unknown))))
+    args = dict(content_exceptions=content_exceptions, index=index,
+                index_exceptions=index_exceptions, qr=qr, qr_imgs=qr_imgs,
+                qr_imgs_exceptions=qr_imgs_exceptions, qr_pages=qr_pages,
+                qr_pages_exceptions=qr_pages_exceptions, qr_pages_rows=qr_pages_rows,
+                qr_pages_cols=qr_pages_cols, qr_pages_filename_fmt=qr_pages_filename_fmt,
+                qr_pages_title_fmt=qr_pages_title_fmt, verbose=verbose,
+                manifest=manifest, qr_cache=qr_cache)
+    vp = _vpg(verbose, "[rebuild]")
+    path = osp.normpath(path)
+    dependents = ([dst for dst, deps in manifest.dependencies.items() if path in deps]
+                  if _dependents and manifest is not None else [])
+    owners = _owners_of(sec, path)
+    if not owners or not osp.isfile(path):
+        if not dependents:
+            vp("'{}' is not a source file of '{}' or its sub_secs".format(path, sec.name))
+            return False
+        owners = []
+    elif not _rebuild_source(owners[-1], path, vp, **args) and not dependents:
+        return True
+    if dependents:
+        # Its hash is in the keys of the dependents
+        manifest.invalidate(path)
+    inventory = FileInventory()
+    exceptions = compile_selectors(content_exceptions)
+    for dst in dependents:
+        s = _sec_of_output(sec, dst)
+        if s is None or s.data_extractor is None:
+            continue
+        store = data_store(s)
+        if store.source_of(dst) is None:
+            _record_outputs(s, inventory, compile_selectors(s.rules.convert_selectors),
+                            exceptions)
+        source = store.source_of(dst)
+        if source is None:
+            vp("The source of '{}' is gone; skipping it".format(dst))
+            continue
+        vp("'{}' depends on '{}'".format(dst, path))
+        rebuild(sec, osp.join(*source), post=False, _dependents=False, **args)
+        for o in _owners_of(sec, osp.join(*source)):
+            if o not in owners:
+                owners.append(o)
+    if post:
+        # In the order 'generator' runs them
+        for s in reversed(owners):
+            for post_generator in s.post_generators:
+                post_generator(s, verbose)
+    return True
+
+
+def _rebuild_source(owner: SecSpec, path: str, vp: Callable,
+                    content_exceptions: Iterable[str], index: bool,
+                    index_exceptions: Iterable[str], qr: bool, qr_imgs: bool,
+                    qr_imgs_exceptions: Iterable[str], qr_pages: bool,
+                    qr_pages_exceptions: Iterable[str], qr_pages_rows: int, qr_pages_cols: int,
+                    qr_pages_filename_fmt: str, qr_pages_title_fmt: str, verbose: bool,
+                    manifest: Optional[BuildManifest], qr_cache: Optional[QRCache]) -> bool:
+    """the part of 'rebuild' regenerating what depends on 'path' in 'owner'
+
+    returns False if 'path' is neither converted nor copied"""
+    dirpath, f = osp.split(path)
+    rel_dirpath = osp.relpath(dirpath, osp.normpath(owner.src_path))
+    inventory = FileInventory()
+    rules = owner.rules
+    exceptions = compile_selectors(content_exceptions)
+    convert_selectors = compile_selectors(rules.convert_selectors)
+    convert = (rules.convert_selected_data and owner.data_extractor and owner.dst_template_path
+               and convert_selectors(f)
+               and (rules.recursive_convert or rel_dirpath == ".")
+               and owner.custom_data_generator is None)
+    if convert and not exceptions(f):
+        dst_f_path = osp.join(owner.dst_path, osp.splitext(f)[0] + ".html")
+        vp(f"Converting '{path}' to '{dst_f_path}'")
+        data_store(owner).invalidate(path)
+        # The index is built from the data_specs of all the pages of the
+        # section, so all of their sources are recorded (they are extracted
+        # lazily, if a previous 'generator' call has not done it already)
+        _record_outputs(owner, inventory, convert_selectors, exceptions)
+        data = convert_file(owner, get_template(owner.dst_template_path), dirpath, f,
+                            dst_f_path)
+        inventory.add(dst_f_path)
+        if manifest is not None:
+            manifest.invalidate(path)
+            record_conversion(owner, manifest, convert_fingerprint(owner, manifest, inventory),
+                              dirpath, f, dst_f_path, data, inventory)
+        if index and owner.generate_index and (owner.index_extractor is not None
+                                               or owner.index_row_builder is not None):
+            index_generator(owner, exceptions=index_exceptions, verbose=verbose,
+                            manifest=manifest, inventory=inventory)
+        if qr and owner.generate_qr and not owner.custom_qr_generator:
+            qr_code = osp.splitext(f)[0]
+            if qr_imgs and owner.url_prefix and not owner.custom_qr_img_generator:
+                qr_imgs_generator(owner, exceptions=qr_imgs_exceptions, verbose=verbose,
+                                  manifest=manifest, inventory=inventory, qr_cache=qr_cache,
+                                  only=(qr_code, ))
+            if qr_pages and owner.generate_qrpages:
+                qr_pages_generator(owner, exceptions=qr_pages_exceptions,
+                                   rows=qr_pages_rows, cols=qr_pages_cols,
+                                   filename_fmt=qr_pages_filename_fmt,
+                                   title_fmt=qr_pages_title_fmt, verbose=verbose,
+                                   manifest=manifest, inventory=inventory, only=(qr_code, ))
+    elif (not convert and rules.copy_selected_data
+          and compile_selectors(rules.copy_selectors)(f)
+          and (rules.recursive_copy or rel_dirpath == ".")):
+        if manifest is not None:
+            manifest.invalidate(path)
+        copy_source(owner, path, osp.normpath(osp.join(owner.dst_path, rel_dirpath, f)), vp,
+                    manifest, inventory)
+    else:
+        vp("'{}' is neither converted nor copied; skipping".format(path))
+        return False
+    return True
 
 
 def file_reader(path: str):
@@ -15,10 +15,11 @@
 
 from typing import List, Union
 
-from attrs import asdict
 from jinja2 import Template
 
 import blogger as b
+from publish.fonts import FontSubsetter
+from publish.search import SearchIndexer
 from . import common as c
 from . import parts as p
 from . import scientists as s
@@ -30,24 +31,24 @@ from . import scientists as s
 # basename is still needed to link to the actual qr code png file
 def custom_qr_table_writer(sec: b.SecSpec, table: List[List[str]], template: Template,
                            path: str, mode: str = "w", title: str = "QR Codes"):
-    with open(path, mode=mode) as f:
-        f.write(
-            template.render(
-                title=title,
-                table=[
-                    table,
-                    [
-                        sec.data_extractor(
-                            dirpath=sec.src_path,
-                            f=p + ".md"
-                        ).header
-                        for p in table[0]
-                    ]
-                ],
-                enumerate=enumerate,
-                len=len
-            )
-        )
+    return b.write_output(
+        sec,
+        path,
+        template.render(
+            title=title,
+            table=[
+                table,
+                [
+                    b.extract_data(sec, sec.src_path, p + ".md").header
+                    for p in table[0]
+                ]
+            ],
+            qr_svgs=b.qr_svgs(sec, table),
+            enumerate=enumerate,
+            len=len
+        ),
+        mode
+    )
 
 
 # Reverse
@@ -56,7 +57,7 @@ def custom_qr_table_writer(sec: b.SecSpec, table: List[List[str]], template: Tem
 def md_data_writer(pd: Union[s.ScientistData, p.PartData],
                    template: Template, path: str, mode: str = "w"):
     with open(path, mode) as f:
-        f.write(template.render(asdict(pd)))
+        f.write(template.render(b.render_context(pd)))
 
 
 parts = b.SecSpec(
@@ -68,17 +69,28 @@ parts = b.SecSpec(
     dst_template_path="scripts/templates/fa_IR/parts/parts_template.html",
     src_template_path="scripts/templates/fa_IR/parts/parts_template.md",
     data_extractor=p.md_data_extractor,
+    data_dependencies=c.picture_dependencies,
     rules=b.Rules(
         copy_selected_data=True,
         recursive_copy=True,
         overwrite_when_copying=True,
+        minify_html=True,
+        onefile_index=False,
+        index_page_size=100,
     ),
     index_template_path="scripts/templates/fa_IR/parts/parts_index_template.html",
     index_extractor=p.index_row_extractor,
+    index_row_builder=p.index_row_builder,
+    search_document_builder=p.search_document,
     index_title="فهرست قطعات",
+    index_feed_filename="index.json",
     # qrpages_template_path="scripts/templates/fa_IR/parts/qr_pages_table_template.html",
     qrpages_template_path="scripts/templates/fa_IR/parts/qr_pages_triangle_template.html",
-    custom_qr_table_writer=custom_qr_table_writer
+    custom_qr_table_writer=custom_qr_table_writer,
+    qrpages_inline_svg=True,
+    # Keeps the printed QR pages stable when parts are added or removed
+    qrpages_layout_path="scripts/fair/qr_layouts/parts.json",
+    post_generators=[c.IMAGE_VARIANTS]
 )
 scientists = b.SecSpec(
     name="fa_ir_scientists",
@@ -89,17 +101,28 @@ scientists = b.SecSpec(
     dst_template_path="scripts/templates/fa_IR/scientists/scientists_template.html",
     src_template_path="scripts/templates/fa_IR/scientists/scientists_template.md",
     data_extractor=s.md_data_extractor,
+    data_dependencies=c.picture_dependencies,
     rules=b.Rules(
         copy_selected_data=True,
         recursive_copy=True,
         overwrite_when_copying=True,
+        minify_html=True,
+        onefile_index=False,
+        index_page_size=100,
     ),
     index_template_path="scripts/templates/fa_IR/scientists/scientists_index_template.html",
     index_extractor=s.index_row_extractor,
+    index_row_builder=s.index_row_builder,
+    search_document_builder=s.search_document,
     index_title="فهرست دانشمندان",
+    index_feed_filename="index.json",
     # qrpages_template_path="scripts/templates/fa_IR/scientists/qr_pages_table_template.html",
     qrpages_template_path="scripts/templates/fa_IR/scientists/qr_pages_triangle_template.html",
-    custom_qr_table_writer=custom_qr_table_writer
+    custom_qr_table_writer=custom_qr_table_writer,
+    qrpages_inline_svg=True,
+    # Keeps the printed QR pages stable when scientists are added or removed
+    qrpages_layout_path="scripts/fair/qr_layouts/scientists.json",
+    post_generators=[c.IMAGE_VARIANTS]
 )
 
 root = b.SecSpec(
@@ -123,5 +146,11 @@ root = b.SecSpec(
             b.MATCH_WOFF2
         ),
         overwrite_when_copying=True,
-    )
+        minify_html=True,
+        minify_css=True,
+    ),
+    post_generators=[
+        FontSubsetter(cache_path=".font_cache"),
+        SearchIndexer(cache_path=".search_cache.json"),
+    ]
 )
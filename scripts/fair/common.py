@@ -13,13 +13,63 @@
 # You should have received a copy of the GNU General Public License along with
 # this program. If not, see <https://www.gnu.org/licenses/>.
 
-from typing import Union, Collection
+import html
+from os import path as osp
+import re
+from typing import Any, List, Union, Collection
+
+from bs4 import BeautifulSoup, Tag
 
 import global_values as gv
+from publish.images import ImageVariants
 FA_IR_PREFIX = gv.PREFIX + "fa_IR/"
 
+# The pictures of the pages; shared by the data extractors (for the
+# 'srcset's) and the sections (as their post generator making the variants)
+IMAGE_VARIANTS = ImageVariants(cache_path=".image_cache")
+
 
 def persian_stringifier(c: Union[None, str, Collection[str]]) -> str:
     """stringify a collection of strings using persian commas if it's not a string already
     if c is None; "-" will be returned"""
     return "-" if c is None else c if isinstance(c, str) else "، ".join(c)
+
+
+_TAG = re.compile(r"<[^>]*>")
+
+
+def html_to_text(s: Any) -> str:
+    """the text of an html snippet (like what BeautifulSoup's '.text' gives
+    us from the generated pages); front matter values may contain html tags
+    which have no place in the (autoescaped) indexes"""
+    return html.unescape(_TAG.sub("", str(s)))
+
+
+def picture_dependencies(dirpath: str, f: str, data: Any) -> List[str]:
+    """'SecSpec.data_dependencies' of the pages having a 'pic' (their
+    'pic_sources' depend on its size)"""
+    return [osp.join(dirpath, data.pic)] if data.pic else []
+
+
+def soup_table_values(soup: BeautifulSoup, markup: bool = False) -> List[str]:
+    """the values of the cells of the table of a generated page (what comes
+    after the '<br>' following the pseudo heading of every cell), in order;
+    with 'markup', as html (the way they are written in the page)
+
+    it doesn't depend on the whitespace between the cells, so it works on
+    minified pages too"""
+    values = []
+    for td in soup.find_all("td"):
+        br = td.find("br")
+        nodes = list(br.next_siblings) if br is not None else td.contents
+        if markup:
+            values.append("".join(n.decode() if isinstance(n, Tag) else n.output_ready()
+                                  for n in nodes))
+        else:
+            values.append("".join(n.get_text() for n in nodes))
+    return values
+
+
+def search_text(s: Any) -> str:
+    """'html_to_text' of a (possibly collection) front matter value"""
+    return html_to_text(persian_stringifier(s))
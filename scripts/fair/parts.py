@@ -16,7 +16,7 @@
 import os
 from os import path as osp
 # from datetime import date
-from typing import Optional, Union, Collection
+from typing import Optional, Union, Collection, Dict, Tuple
 
 from attrs import asdict, frozen
 from bs4 import BeautifulSoup
@@ -44,6 +44,8 @@ class PartData:
     pic: Optional[str] = None
     table: Optional[PartTable] = None
     explanation_paragraphs: Optional[Union[str, Collection[str]]] = None
+    # ((mime type, srcset), ...) of the variants of 'pic'
+    pic_sources: Tuple[Tuple[str, str], ...] = ()
 
 
 @frozen
@@ -72,6 +74,7 @@ def md_data_extractor(dirpath: str, f: str) -> PartData:
         title=fl["title"],
         header=fl["header"],
         pic=fl["pic"],
+        pic_sources=c.IMAGE_VARIANTS.srcsets(dirpath, fl["pic"]),
         table=md_table_extractor(fl),
         explanation_paragraphs=fl.content
     )
@@ -81,30 +84,53 @@ def md_data_extractor(dirpath: str, f: str) -> PartData:
 
 
 def soup_table_extractor(soup: BeautifulSoup) -> PartTable:
-    rows = [row.text.strip("\n").replace("\n", ":").split(":")
-            for row in soup.find_all("tr")]
+    values = c.soup_table_values(soup)
     return PartTable(
-        name=rows[0][1],
-        manufacturing_date=rows[0][3],
-        category=rows[1][1],
-        manufacturer_name=rows[1][3],
-        manufacturer_country=rows[2][1]
+        name=values[0],
+        manufacturing_date=values[1],
+        category=values[2],
+        manufacturer_name=values[3],
+        manufacturer_country=values[4]
     )
 
 
 def escapeless_soup_table_extractor(soup: BeautifulSoup) -> PartTable:
-    rows = [str(row).strip("\n").replace("\n", ":").split(":")
-            for row in soup.find_all("tr")]
-    # print(rows)
+    values = c.soup_table_values(soup, markup=True)
     return PartTable(
-        name=rows[0][2][9:-5],  # removing "</b><br/>" from start and "</td>" from end
-        manufacturing_date=rows[0][4][9:-5],
-        category=rows[1][2][9:-5],
-        manufacturer_name=rows[1][4][9:-5],
-        manufacturer_country=rows[2][2][9:-5]
+        name=values[0],
+        manufacturing_date=values[1],
+        category=values[2],
+        manufacturer_name=values[3],
+        manufacturer_country=values[4]
     )
 
 
+def index_row_builder(dirpath: str, f: str, pd: PartData) -> PartsIndexRow:
+    return PartsIndexRow(
+        filename=f,
+        link=f,
+        part_title=c.html_to_text(pd.title),
+        table=PartTable(
+            name=c.html_to_text(pd.table.name),
+            manufacturing_date=c.html_to_text(pd.table.manufacturing_date),
+            category=c.html_to_text(pd.table.category),
+            manufacturer_name=c.html_to_text(pd.table.manufacturer_name),
+            manufacturer_country=c.html_to_text(pd.table.manufacturer_country)
+        )
+    )
+
+
+def search_document(dirpath: str, f: str, pd: PartData) -> Dict[str, str]:
+    return {
+        "title": c.search_text(pd.title),
+        "name": c.search_text(pd.table.name),
+        "category": c.search_text(pd.table.category),
+        "manufacturer": c.search_text(pd.table.manufacturer_name),
+        "country": c.search_text(pd.table.manufacturer_country),
+        "text": c.search_text(pd.explanation_paragraphs),
+    }
+
+
 def index_row_extractor(dirpath: str, f: str) -> PartsIndexRow:
     path = osp.join(dirpath, f)
     f_text = b.file_reader(path)
@@ -14,7 +14,7 @@
 # this program. If not, see <https://www.gnu.org/licenses/>.
 
 from os import path as osp
-from typing import Collection, Optional, Union
+from typing import Collection, Dict, Optional, Union, Tuple
 
 from attrs import frozen
 from bs4 import BeautifulSoup
@@ -50,6 +50,8 @@ class ScientistData:
     table: Optional[ScientistTable] = None
     bio_summary: Optional[Union[str, Collection[str]]] = None
     bio: Optional[Union[str, Collection[str]]] = None
+    # ((mime type, srcset), ...) of the variants of 'pic'
+    pic_sources: Tuple[Tuple[str, str], ...] = ()
 
 
 @frozen
@@ -81,6 +83,7 @@ def md_data_extractor(dirpath, f) -> ScientistData:
         title=fl["title"],
         header=fl["header"],
         pic=fl["pic"],
+        pic_sources=c.IMAGE_VARIANTS.srcsets(dirpath, fl["pic"]),
         table=md_table_extractor(fl),
         bio=fl.content
     )
@@ -90,37 +93,67 @@ def md_data_extractor(dirpath, f) -> ScientistData:
 
 
 def soup_table_extractor(soup: BeautifulSoup) -> ScientistTable:
-    rows = [row.text.strip("\n").replace("\n", ":").split(":")
-            for row in soup.find_all("tr")]
+    values = c.soup_table_values(soup)
     return ScientistTable(
-        name=rows[0][1],
-        born=rows[0][3],
-        died=rows[1][1],
-        gender=True if rows[1][3] == "مرد" else False,
-        nationality=rows[2][1],
-        alma_mater=rows[2][3],
-        known_for=rows[3][1],
-        awards=rows[3][3],
-        tags=rows[4][1]
+        name=values[0],
+        born=values[1],
+        died=values[2],
+        gender=True if values[3] == "مرد" else False,
+        nationality=values[4],
+        alma_mater=values[5],
+        known_for=values[6],
+        awards=values[7],
+        tags=values[8]
     )
 
 
 def escapeless_soup_table_extractor(soup: BeautifulSoup) -> ScientistTable:
-    rows = [str(row).strip("\n").replace("\n", ":").split(":")
-            for row in soup.find_all("tr")]
+    values = c.soup_table_values(soup, markup=True)
     return ScientistTable(
-        name=rows[0][2][9:-5],  # removing "</b><br/>" from start and "</td>" from end
-        born=rows[0][4][9:-5],
-        died=rows[1][2][9:-5],
-        gender=True if rows[1][4][9:-5] == "مرد" else False,
-        nationality=rows[2][2][9:-5],
-        alma_mater=rows[2][4][9:-5],
-        known_for=rows[3][2][9:-5],
-        awards=rows[3][4][9:-5],
-        tags=rows[4][2][9:-5]
+        name=values[0],
+        born=values[1],
+        died=values[2],
+        gender=True if values[3] == "مرد" else False,
+        nationality=values[4],
+        alma_mater=values[5],
+        known_for=values[6],
+        awards=values[7],
+        tags=values[8]
     )
 
 
+def index_row_builder(dirpath: str, f: str, sd: ScientistData) -> ScientistsIndexRow:
+    return ScientistsIndexRow(
+        filename=f,
+        link=f,
+        scientist_title=c.html_to_text(sd.title),
+        table=ScientistTable(
+            name=c.html_to_text(sd.table.name),
+            born=c.html_to_text(sd.table.born),
+            died=c.html_to_text(sd.table.died),
+            gender=sd.table.gender,
+            nationality=c.html_to_text(sd.table.nationality),
+            alma_mater=c.html_to_text(sd.table.alma_mater),
+            known_for=c.html_to_text(sd.table.known_for),
+            awards=c.html_to_text(sd.table.awards),
+            tags=c.html_to_text(sd.table.tags)
+        )
+    )
+
+
+def search_document(dirpath: str, f: str, sd: ScientistData) -> Dict[str, str]:
+    return {
+        "title": c.search_text(sd.title),
+        "name": c.search_text(sd.table.name),
+        "nationality": c.search_text(sd.table.nationality),
+        "alma_mater": c.search_text(sd.table.alma_mater),
+        "known_for": c.search_text(sd.table.known_for),
+        "awards": c.search_text(sd.table.awards),
+        "tags": c.search_text(sd.table.tags),
+        "text": c.search_text(sd.bio),
+    }
+
+
 def index_row_extractor(dirpath: str, f: str) -> ScientistsIndexRow:
     path = osp.join(dirpath, f)
     f_text = b.file_reader(path)
@@ -0,0 +1,118 @@
+# Copyright 2023 MohammadMohsen Akbarpoor Darabi (M. MAD)
+
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""A QR image backend (for 'SecSpec.custom_qr_img_generator') that draws
+the QR codes with numpy and encodes the PNGs itself, in a pool of processes;
+the images are pixel-identical to the ones 'blogger.qr_imgs_generator'
+makes with the same 'QRParams'"""
+
+import os
+from os import path as osp
+import struct
+import zlib
+from typing import Iterable, Optional
+
+from attrs import frozen
+import qrcode as qr
+
+import blogger as b
+
+try:
+    import numpy as np
+except ImportError:  # It's optional; we fall back to 'qr_imgs_generator'
+    np = None
+
+
+def qr_matrix(url: str, params: b.QRParams = b.QRParams()) -> "np.ndarray":
+    """the modules of the QR code of 'url' (border included); True is dark"""
+    code = qr.QRCode(error_correction=params.error_correction,
+                     box_size=params.box_size, border=params.border)
+    code.add_data(url)
+    code.make(fit=True)
+    return np.array(code.get_matrix(), dtype=bool)
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return (struct.pack(">I", len(data)) + kind + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+
+def encode_png(matrix: "np.ndarray", box_size: int) -> bytes:
+    """a 1-bit grayscale PNG of 'matrix' with every module scaled to a
+    'box_size' square (which is what qrcode's PilImage draws)"""
+    # Light pixels are white (1) in a 1-bit grayscale image
+    pixels = np.repeat(np.repeat(~matrix, box_size, axis=0), box_size, axis=1)
+    height, width = pixels.shape
+    rows = np.packbits(pixels, axis=1)
+    # Every scanline starts with its filter type (0, None)
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), rows]).tobytes()
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)),
+        _png_chunk(b"IDAT", zlib.compress(raw, 9)),
+        _png_chunk(b"IEND", b""),
+    ))
+
+
+def write_qr_png(url: str, path: str, params: b.QRParams = b.QRParams()):
+    os.makedirs(osp.dirname(osp.abspath(path)), exist_ok=True)
+    with b.replacing(path) as tmp, open(tmp, mode="wb") as f:
+        f.write(encode_png(qr_matrix(url, params), params.box_size))
+
+
+def _write_qr_png_job(job):
+    write_qr_png(*job)
+
+
+@frozen
+class NumpyQRImgGenerator:
+    """use an instance of it as 'SecSpec.custom_qr_img_generator'; with a
+    'cache_path' it shares the layout of 'blogger.QRCache', so only the urls
+    that are not in the cache are encoded"""
+    workers: int = b.DEFAULT_WORKERS
+    cache_path: Optional[str] = None
+
+    def __call__(self, sec: b.SecSpec, exceptions: Iterable[str] = b.CE,
+                 verbose: bool = False):
+        vp = b._vpg(verbose, "[NumpyQRImgGenerator]")
+        if np is None or sec.qr_params.image_format.lower() != "png":
+            vp("numpy is not available or 'sec.qr_params.image_format' is not "
+               "png; falling back to 'qr_imgs_generator'")
+            return b.qr_imgs_generator(sec, exceptions, verbose)
+        if not sec.url_prefix:
+            vp("'sec.url_prefix' is not provided; skipping QR Image generation")
+            return
+        exceptions = b.compile_selectors(exceptions)
+        qr_dirpath = osp.join(sec.dst_path, sec.qr_dirname)
+        cache = b.QRCache(self.cache_path) if self.cache_path else None
+        # (url, path of the image to encode, path of the QR image)
+        images = []
+        for dirpath, dirnames, filenames in os.walk(sec.dst_path):
+            for f in filenames:
+                if not f.endswith(".html") or exceptions(f):
+                    continue
+                url = sec.url_prefix + osp.splitext(f)[0]
+                qr_path = osp.join(qr_dirpath, osp.splitext(f)[0] + ".png")
+                images.append((url, cache.path_of(url, sec.qr_params) if cache else qr_path,
+                               qr_path))
+        jobs = [(url, target, sec.qr_params) for url, target, qr_path in images
+                if cache is None or not osp.exists(target)]
+        vp("Encoding {} QR Images using {} worker processes".format(len(jobs), self.workers))
+        b.run_jobs(_write_qr_png_job, jobs, self.workers)
+        if cache is not None:
+            for url, target, qr_path in images:
+                if not b.files_identical(target, qr_path):
+                    vp("Copying the QR Image of", url, "from", target)
+                    b.copy_file(target, qr_path, sec.rules.copy_mode)
@@ -16,6 +16,9 @@
 import blogger as b
 import global_values as gv
 import fair
+from publish.optimize import ImageOptimizer
+from publish.compress import Precompressor
+from publish.fingerprint import AssetFingerprinter
 
 
 document_root = b.SecSpec(
@@ -33,17 +36,35 @@ document_root = b.SecSpec(
         copy_selected_data=True,
         recursive_copy=False,
         overwrite_when_copying=True,
-    )
+    ),
+    # Run once everything is generated, in this order
+    post_generators=[
+        ImageOptimizer(cache_path=".image_cache"),
+        # Serve 'nginx_immutable.conf' from the site's server block
+        AssetFingerprinter(nginx_path="nginx_immutable.conf",
+                           cache_path=".fingerprint_cache.json"),
+        Precompressor(cache_path=".sidecar_cache.json"),
+    ]
+)
+
+
+# Shared with 'watch.py'
+GENERATOR_ARGS = dict(
+    qr_pages_rows=1,
+    qr_pages_cols=4,
+    # Remove this file to force a full rebuild
+    manifest_path="build_manifest.json",
+    qr_cache_path=".qr_cache",
+    # workers=4,  # Pays off only for large sections
+    # profile="build_profile.json",  # Where the time, memory and I/O go
+    # output_workers=4,  # Overlaps rendering with writing (for slow disks)
+    # verbose=True
 )
 
 
 def main():
-    b.generator(
-        document_root,
-        qr_pages_rows=1,
-        qr_pages_cols=4,
-        # verbose=True
-    )
+    b.configure_environments(bytecode_cache_dir=".jinja_cache")
+    b.generator(document_root, **GENERATOR_ARGS)
 
 
 if __name__ == "__main__":
@@ -13,12 +13,11 @@
 # You should have received a copy of the GNU General Public License along with
 # this program. If not, see <https://www.gnu.org/licenses/>.
 
-import sys
 import os
 from os import path as osp
 from typing import Any, Optional, Callable, Tuple
 
-from jinja2 import Environment, FileSystemLoader, select_autoescape, Template
+from jinja2 import Template
 # from markdownify import markdownify as md
 
 import blogger as b
@@ -31,10 +30,7 @@ def html_to_md(
     exceptions: Optional[Tuple[str]] = b.CE,
     dry_run: bool = True
 ):
-    template = Environment(
-        loader=FileSystemLoader(osp.dirname(sec.src_template_path)),
-        autoescape=False  # select_autoescape()
-    ).get_template(osp.basename(sec.src_template_path))
+    template = b.get_template(sec.src_template_path)
 
     exceptions = b.re_collection_compiler(exceptions)
     # data_dict = dict()
@@ -0,0 +1,167 @@
+# Copyright 2023 MohammadMohsen Akbarpoor Darabi (M. MAD)
+
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""Precompressed '.gz' (and '.br') siblings of the text and font files of
+the generated site, for servers serving them as they are ('gzip_static',
+'brotli_static'); use a 'Precompressor' as the last post generator"""
+
+import os
+from os import path as osp
+import gzip
+import json
+from typing import Dict, Optional, Tuple
+
+from attrs import frozen
+
+import blogger as b
+
+try:
+    import brotli
+except ImportError:  # It's optional; only the '.gz' siblings are made without it
+    brotli = None
+
+SIDECARS = ("gz", "br")
+
+
+def supported_sidecars(sidecars: Tuple[str, ...]) -> Tuple[str, ...]:
+    return tuple(s for s in sidecars if s != "br" or brotli is not None)
+
+
+def compress(data: bytes, sidecar: str) -> bytes:
+    if sidecar == "gz":
+        # 'mtime=0' keeps the output the same for the same input
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if sidecar == "br":
+        return brotli.compress(data, quality=11)
+    raise ValueError("Unknown sidecar: {!r}".format(sidecar))
+
+
+def sidecar_up_to_date(path: str, sidecar_path: str) -> bool:
+    """sidecars get the mtime of the file they're made from (see
+    'write_sidecars'), so any other mtime means the file has changed"""
+    try:
+        return os.stat(sidecar_path).st_mtime_ns == os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def remove_sidecar(sidecar_path: str) -> bool:
+    """removes the sidecar if it's there; returns whether it was"""
+    try:
+        os.remove(sidecar_path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def write_sidecars(path: str, sidecars: Tuple[str, ...]) -> Tuple[str, ...]:
+    """writes the 'sidecars' of 'path' which are smaller than it (and
+    removes the others); returns the sidecars written"""
+    with open(path, "rb") as f:
+        data = f.read()
+    st = os.stat(path)
+    written = []
+    for sidecar in sidecars:
+        sidecar_path = path + "." + sidecar
+        compressed = compress(data, sidecar)
+        if len(compressed) >= len(data):
+            # The old one (of a larger version of 'path') would be served
+            remove_sidecar(sidecar_path)
+            continue
+        with b.replacing(sidecar_path) as tmp:
+            with open(tmp, "wb") as f:
+                f.write(compressed)
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        written.append(sidecar)
+    return tuple(written)
+
+
+def _write_sidecars_job(job: Tuple[str, Tuple[str, ...]]) -> Tuple[str, ...]:
+    return write_sidecars(*job)
+
+
+@frozen
+class Precompressor:
+    """with 'cache_path', what was made of every file (the sidecars smaller
+    than it) is recorded there; so the files not getting any smaller are not
+    compressed again until they change, and the sidecars of the removed
+    files are removed (only the ones made here; without the record, a '.gz'
+    without its file may as well be an asset of its own)"""
+    selectors: Tuple[str, ...] = (b.MATCH_HTML, b.MATCH_CSS, b.MATCH_SVG, b.MATCH_TTF)
+    sidecars: Tuple[str, ...] = SIDECARS
+    # Smaller files are not worth it (and mostly would not get any smaller)
+    min_size: int = 256
+    workers: int = b.DEFAULT_WORKERS
+    cache_path: Optional[str] = None
+
+    def __call__(self, sec: b.SecSpec, verbose: bool = False):
+        vp = b._vpg(verbose, "[Precompressor]")
+        if sec.dst_path is None:
+            return
+        sidecars = supported_sidecars(self.sidecars)
+        if sidecars != self.sidecars:
+            vp("brotli is not available; skipping the '.br' sidecars")
+        selectors = b.compile_selectors(self.selectors)
+        # path -> [size, mtime_ns, [the sidecars made of it]]
+        record: Dict[str, list] = {}
+        if self.cache_path and osp.exists(self.cache_path):
+            with open(self.cache_path, "r") as f:
+                record = json.load(f)
+        # path -> the (recorded) sidecars of it that are up to date
+        current: Dict[str, Tuple[str, ...]] = {}
+        jobs = []
+        for dirpath, dirnames, filenames in os.walk(sec.dst_path):
+            for f in filenames:
+                if not selectors(f):
+                    continue
+                path = osp.normpath(osp.join(dirpath, f))
+                st = os.stat(path)
+                if st.st_size < self.min_size:
+                    # The old ones (of a larger version of it) would be served
+                    for s in SIDECARS:
+                        if remove_sidecar(path + "." + s):
+                            vp("Removing the sidecar '{}.{}'".format(path, s))
+                    continue
+                recorded = record.get(path)
+                unchanged = recorded is not None and recorded[:2] == [st.st_size, st.st_mtime_ns]
+                made = tuple(s for s in sidecars
+                             if sidecar_up_to_date(path, path + "." + s))
+                # The ones not smaller than the file are up to date too, as
+                # long as the file is unchanged
+                outdated = tuple(s for s in sidecars if s not in made and not (
+                    unchanged and s not in recorded[2] and not osp.exists(path + "." + s)
+                ))
+                current[path] = made
+                if outdated:
+                    jobs.append((path, outdated))
+        vp("Compressing {} files using {} worker processes".format(len(jobs), self.workers))
+        results = b.run_jobs(_write_sidecars_job, jobs, self.workers)
+        for (path, outdated), written in zip(jobs, results):
+            current[path] = tuple(s for s in current[path] if s not in outdated) + written
+        vp("Wrote {} sidecars".format(sum(map(len, results))))
+        if not self.cache_path:
+            return
+        # The files that are gone (like the stale fingerprinted assets)
+        for path in set(record).difference(current):
+            if not osp.exists(path):
+                for s in record[path][2]:
+                    if remove_sidecar(path + "." + s):
+                        vp("Removing the orphaned sidecar '{}.{}'".format(path, s))
+        new_record = {}
+        for path, made in current.items():
+            st = os.stat(path)
+            new_record[path] = [st.st_size, st.st_mtime_ns, sorted(made)]
+        os.makedirs(osp.dirname(osp.abspath(self.cache_path)), exist_ok=True)
+        b.write_if_changed(self.cache_path, json.dumps(new_record, sort_keys=True, indent=0))
@@ -0,0 +1,253 @@
+# Copyright 2023 MohammadMohsen Akbarpoor Darabi (M. MAD)
+
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""Content-fingerprinted copies of the assets of the generated site (like
+'style.0123456789.css') and the references to them in its pages and
+stylesheets, so they can be cached forever; use an 'AssetFingerprinter' as
+a post generator of the section covering all of them (after the stages
+changing the assets, before 'Precompressor')"""
+
+import os
+from os import path as osp
+import re
+import html
+from urllib.parse import unquote
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from attrs import frozen
+
+import blogger as b
+
+HASH_LENGTH = 10
+# An asset name with (or without) a fingerprint; 'name(.hash)?.ext'
+_FINGERPRINTED = re.compile(r"^(?P<name>.+?)(?:\.(?P<hash>[0-9a-f]{%d}))?(?P<ext>\.\w+)$"
+                            % HASH_LENGTH)
+_HTML_URL = re.compile(r"""(?P<attr>\b(?:src|href)\s*=\s*)(?P<q>["'])(?P<url>.*?)(?P=q)""",
+                       re.IGNORECASE)
+_HTML_SRCSET = re.compile(r"""(?P<attr>\bsrcset\s*=\s*)(?P<q>["'])(?P<url>.*?)(?P=q)""",
+                          re.IGNORECASE)
+_CSS_URL = re.compile(r"""(?P<attr>url\(\s*)(?P<q>["']?)(?P<url>.*?)(?P=q)(?=\s*\))""")
+_CSS_ESCAPE = re.compile(r"\\(.)")
+_URL_PARTS = re.compile(r"([^?#]*)(.*)", re.DOTALL)
+
+NGINX_SNIPPET = """\
+# Generated by 'publish.fingerprint.AssetFingerprinter'; the fingerprinted
+# assets never change, a new version of them gets a new name
+location ~* "\\.[0-9a-f]{{{length}}}\\.({extensions})$" {{
+    add_header Cache-Control "public, max-age=31536000, immutable";
+    gzip_static on;
+}}
+"""
+
+
+def fingerprinted_name(f: str, file_hash: str) -> str:
+    m = _FINGERPRINTED.match(f)
+    return "{}.{}{}".format(m.group("name"), file_hash[:HASH_LENGTH], m.group("ext"))
+
+
+def original_name(f: str) -> str:
+    """'f' without its fingerprint (if any)"""
+    m = _FINGERPRINTED.match(f)
+    return m.group("name") + m.group("ext") if m else f
+
+
+def original_path(path: str) -> str:
+    return osp.join(osp.dirname(path), original_name(osp.basename(path)))
+
+
+def _relative_url(url: str) -> bool:
+    """whether 'url' is a relative url of a file (the only ones we rewrite)"""
+    return bool(url) and "//" not in url and not url.startswith(("/", "#", "data:", "mailto:"))
+
+
+def _url_path(dirpath: str, url: str) -> str:
+    """the path of the file the relative 'url' (as it's written in a file in
+    'dirpath') refers to"""
+    head = _URL_PARTS.match(url).group(1)
+    return osp.normpath(osp.join(dirpath, _CSS_ESCAPE.sub(r"\1", unquote(html.unescape(head)))))
+
+
+def _urls(pattern: re.Pattern, text: str, srcset: bool = False) -> Iterator[str]:
+    for m in pattern.finditer(text):
+        if srcset:
+            yield from (c.split()[0] for c in m.group("url").split(",") if c.strip())
+        else:
+            yield m.group("url")
+
+
+def references(path: str) -> Set[str]:
+    """the paths of the files the page or the stylesheet 'path' refers to"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.lower().endswith(".css"):
+        urls = _urls(_CSS_URL, text)
+    else:
+        urls = [*_urls(_HTML_URL, text), *_urls(_HTML_SRCSET, text, srcset=True)]
+    dirpath = osp.dirname(path)
+    return {_url_path(dirpath, url) for url in urls if _relative_url(url)}
+
+
+@frozen
+class AssetFingerprinter:
+    """links every asset the pages (and the stylesheets they use) refer to
+    to its fingerprinted name (keeping the original, which the old pages and
+    the outside links may be using) and rewrites the (relative) references
+    to them; the copies no longer referenced are removed; with 'nginx_path'
+    an nginx snippet marking the fingerprinted assets immutable is written
+    there and with 'headers_path' a '_headers' file listing them; with
+    'cache_path' the hashes of the assets are kept there by their sizes and
+    mtimes (see 'BuildManifest.source_hash'), so the unchanged ones are not
+    read again"""
+    asset_selectors: Tuple[str, ...] = (
+        b.MATCH_CSS, b.MATCH_TTF, b.MATCH_WOFF, b.MATCH_WOFF2, b.MATCH_PNG, b.MATCH_JPG,
+        b.MATCH_SVG, r"(?i:^.*\.webp$)", r"(?i:^.*\.avif$)"
+    )
+    nginx_path: Optional[str] = None
+    headers_path: Optional[str] = None
+    cache_path: Optional[str] = None
+
+    def __call__(self, sec: b.SecSpec, verbose: bool = False):
+        vp = b._vpg(verbose, "[AssetFingerprinter]")
+        if sec.dst_path is None:
+            return
+        selectors = b.compile_selectors(self.asset_selectors)
+        hashes = b.BuildManifest.load(self.cache_path) if self.cache_path else None
+        file_hash = hashes.source_hash if hashes is not None else b.file_hash
+        assets, stylesheets, pages = [], [], []
+        for dirpath, dirnames, filenames in os.walk(sec.dst_path):
+            for f in filenames:
+                path = osp.normpath(osp.join(dirpath, f))
+                if f.endswith(".html"):
+                    pages.append(path)
+                elif not selectors(f):
+                    continue
+                elif _FINGERPRINTED.match(f).group("hash"):
+                    # A fingerprinted copy (of ours, or content addressed
+                    # like the font subsets); dropped below if it's stale
+                    assets.append(path)
+                elif f.lower().endswith(".css"):
+                    stylesheets.append(path)
+                else:
+                    assets.append(path)
+        # Only the assets in use are fingerprinted; the stylesheets the pages
+        # use may refer to more of them
+        linked: Set[str] = set()
+        for path in pages:
+            linked |= references(path)
+        referenced = {original_path(p) for p in linked}
+        used_stylesheets = []
+        pending = [path for path in stylesheets if path in referenced]
+        while pending:
+            path = pending.pop()
+            used_stylesheets.append(path)
+            linked |= references(path)
+            new = {original_path(p) for p in linked} - referenced
+            referenced |= new
+            pending.extend(p for p in stylesheets if p in new)
+        # original path -> fingerprinted path
+        renames: Dict[str, str] = {}
+        copies = set()
+        for path in assets:
+            f = osp.basename(path)
+            if _FINGERPRINTED.match(f).group("hash"):
+                copies.add(path)
+            elif path in referenced:
+                renames[path] = self.fingerprint(path, file_hash(path), vp)
+        # Stylesheets refer to the other assets, so their fingerprints are
+        # known only after their references are rewritten
+        for path in sorted(used_stylesheets):
+            self.rewrite(path, renames, _CSS_URL, vp)
+            renames[path] = self.fingerprint(path, file_hash(path), vp)
+        for path in pages:
+            self.rewrite(path, renames, _HTML_URL, vp)
+            self.rewrite(path, renames, _HTML_SRCSET, vp, srcset=True)
+        current = set(renames.values())
+        originals = set(assets) | set(stylesheets)
+        for path in copies:
+            original = original_path(path)
+            # The pages still refer to it as it is when its original is gone
+            if path in current or (path in linked and original not in originals):
+                current.add(path)
+                continue
+            # Our copies are named after their contents (unlike the content
+            # addressed files of the other stages, like the font subsets);
+            # a copy of ours is stale if it's not in use, even if its
+            # original is gone
+            if original in originals or fingerprinted_name(
+                    osp.basename(original), b.file_hash(path)) == osp.basename(path):
+                vp("Removing the stale '{}'".format(path))
+                os.remove(path)
+            else:
+                current.add(path)
+        if hashes is not None:
+            # Forgetting the removed assets
+            hashes.sources = {p: h for p, h in hashes.sources.items() if osp.exists(p)}
+            hashes.save()
+        if self.nginx_path:
+            extensions = sorted({osp.splitext(p)[1][1:].lower() for p in current})
+            b.write_if_changed(self.nginx_path, NGINX_SNIPPET.format(
+                length=HASH_LENGTH, extensions="|".join(extensions)))
+        if self.headers_path:
+            b.write_if_changed(self.headers_path, "".join(
+                "/{}\n  Cache-Control: public, max-age=31536000, immutable\n".format(
+                    osp.relpath(p, sec.dst_path).replace(os.sep, "/"))
+                for p in sorted(current)))
+
+    def fingerprint(self, path: str, file_hash: str, vp) -> str:
+        """returns the fingerprinted copy of 'path', making it if needed"""
+        dst = osp.join(osp.dirname(path), fingerprinted_name(osp.basename(path), file_hash))
+        if not osp.exists(dst):
+            vp("Fingerprinting '{}' as '{}'".format(path, dst))
+            # A hardlink costs no space; the builds replace the files rather
+            # than writing into them (see 'b.copy_file'), so the copy never
+            # changes with 'path'
+            b.copy_file(path, dst, "hardlink")
+        return osp.normpath(dst)
+
+    def rewrite(self, path: str, renames: Dict[str, str], pattern: re.Pattern, vp,
+                srcset: bool = False):
+        dirpath = osp.dirname(path)
+
+        def rewrite_url(url: str) -> str:
+            if not _relative_url(url):
+                return url
+            # The query and the fragment are kept as they are
+            head, rest = _URL_PARTS.match(url).groups()
+            prefix, slash, written = head.rpartition("/")
+            written_m = _FINGERPRINTED.match(written)
+            original = original_path(_url_path(dirpath, url))
+            if written_m is None or original not in renames:
+                return url
+            new_hash = _FINGERPRINTED.match(osp.basename(renames[original])).group("hash")
+            # The name is kept as it's written (escaped, quoted) in the url
+            return "{}{}{}.{}{}{}".format(prefix, slash, written_m.group("name"), new_hash,
+                                          written_m.group("ext"), rest)
+
+        def replace(m: re.Match) -> str:
+            value = m.group("url")
+            if srcset:
+                value = ", ".join(" ".join([rewrite_url(c.split()[0])] + c.split()[1:])
+                                  for c in value.split(",") if c.strip())
+            else:
+                value = rewrite_url(value)
+            return m.group("attr") + m.group("q") + value + m.group("q")
+
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        rewritten = pattern.sub(replace, text)
+        if rewritten != text:
+            vp("Rewriting the references of '{}'".format(path))
+            with b.replacing(path) as tmp, open(tmp, "w", encoding="utf-8") as f:
+                f.write(rewritten)
@@ -0,0 +1,229 @@
+# Copyright 2023 MohammadMohsen Akbarpoor Darabi (M. MAD)
+
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""Subsetting the web fonts of a section to the characters its pages use;
+use a 'FontSubsetter' as a post generator of the section which has the
+fonts (and their '@font-face' rules) in its output"""
+
+import os
+from os import path as osp
+import re
+import html
+from typing import Iterable, List, Optional, Set, Tuple
+
+from attrs import frozen
+
+import blogger as b
+
+try:
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+except ImportError:  # It's optional; the fonts are left as they are without it
+    subset = TTFont = None
+
+# (name, ((first, last), ...)); a font is split into one file per shard so a
+# page only downloads the shards it has characters of
+SHARDS = (
+    ("arabic", ((0x0600, 0x06FF), (0x0750, 0x077F), (0x08A0, 0x08FF), (0x200C, 0x200F),
+                (0xFB50, 0xFDFF), (0xFE70, 0xFEFF))),
+    ("latin", ((0x0000, 0x024F), (0x2000, 0x206F), (0x20A0, 0x20CF), (0x2100, 0x214F))),
+)
+# Always kept; so a small edit does not fall back to another font before the
+# next subsetting
+SAFETY_CHARS = frozenset(
+    [chr(c) for c in range(0x20, 0x7F)]  # Basic Latin
+    + [chr(c) for c in range(0x06F0, 0x06FA)]  # Persian digits
+    + list(" «»،؛؟ـ‌‍‎‏")
+)
+
+_TAG = re.compile(r"<[^>]*>")
+_FONT_FACE = re.compile(r"@font-face\s*{[^}]*}")
+_SRC = re.compile(r"src\s*:[^;]*;")
+_URL = re.compile(r"""url\(\s*(['"]?)(.*?)\1\s*\)(\s*format\(\s*['"]?([\w-]+)['"]?\s*\))?""")
+_CSS_ESCAPE = re.compile(r"\\(.)")
+# <font>.<shard>.<key>.<ext> (see 'FontSubsetter')
+_SUBSET_NAME = re.compile(r"[^.]+\.\w+\.[0-9a-f]{10}\.(?:woff2?|[ot]tf)")
+
+
+def page_chars(path: str) -> Set[str]:
+    """the characters of the text of the html page at 'path'"""
+    with open(path, "r", encoding="utf-8") as f:
+        return set(html.unescape(_TAG.sub("", f.read())))
+
+
+def unicode_range(codepoints: Iterable[int]) -> str:
+    """the value of a 'unicode-range' descriptor covering 'codepoints'"""
+    ranges: List[List[int]] = []
+    for c in sorted(set(codepoints)):
+        if ranges and ranges[-1][1] + 1 == c:
+            ranges[-1][1] = c
+        else:
+            ranges.append([c, c])
+    return ", ".join("U+{:X}".format(first) if first == last else "U+{:X}-{:X}".format(first, last)
+                     for first, last in ranges)
+
+
+def shard_codepoints(chars: Iterable[str],
+                     shards=SHARDS) -> List[Tuple[str, Tuple[int, ...]]]:
+    """splits 'chars' into the (non-empty) 'shards'; the characters out of all
+    of the shards go to the last one, named "other" """
+    codepoints = {ord(c) for c in chars}
+    result = []
+    for name, ranges in shards:
+        selected = tuple(sorted(c for c in codepoints
+                                if any(first <= c <= last for first, last in ranges)))
+        codepoints.difference_update(selected)
+        if selected:
+            result.append((name, selected))
+    if codepoints:
+        result.append(("other", tuple(sorted(codepoints))))
+    return result
+
+
+def font_codepoints(path: str) -> Set[int]:
+    """the codepoints 'path' has glyphs for"""
+    with TTFont(path, lazy=True) as font:
+        return set(font.getBestCmap())
+
+
+def subset_font(src: str, dst: str, codepoints: Iterable[int], flavor: Optional[str]):
+    """keeps the glyphs of 'codepoints' in 'src' (and the ones reachable from
+    them through the layout features, for shaping)"""
+    options = subset.Options()
+    options.flavor = flavor
+    options.notdef_outline = True
+    font = subset.load_font(src, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    os.makedirs(osp.dirname(osp.abspath(dst)), exist_ok=True)
+    with b.replacing(dst) as tmp:
+        subset.save_font(font, tmp, options)
+    font.close()
+
+
+def _subset_font_job(job):
+    subset_font(*job)
+
+
+def _css_url(url: str) -> str:
+    return _CSS_ESCAPE.sub(r"\1", url)
+
+
+@frozen
+class FontSubsetter:
+    """subsets the fonts referenced in the '@font-face' rules of 'css_path'
+    (relative to 'sec.src_path' and 'sec.dst_path', the rules are always
+    read from the source) and rewrites the output stylesheet to use them,
+    one '@font-face' per shard with its 'unicode-range'; subsets are cached
+    by the font and the set of characters they are made for (the hashes of
+    the fonts are kept there too, see 'BuildManifest.source_hash')"""
+    css_path: str = "fonts.css"
+    shards: tuple = SHARDS
+    safety_chars: frozenset = SAFETY_CHARS
+    cache_path: Optional[str] = None
+    workers: int = b.DEFAULT_WORKERS
+
+    def collect_chars(self, sec: b.SecSpec) -> Set[str]:
+        chars = set(self.safety_chars)
+        for dirpath, dirnames, filenames in os.walk(sec.dst_path):
+            for f in filenames:
+                if f.endswith(".html"):
+                    chars.update(page_chars(osp.join(dirpath, f)))
+        # Layout characters are not drawn
+        chars.difference_update("\n\r\t")
+        return chars
+
+    def __call__(self, sec: b.SecSpec, verbose: bool = False):
+        vp = b._vpg(verbose, "[FontSubsetter]")
+        if subset is None:
+            vp("fontTools is not available; skipping font subsetting")
+            return
+        if sec.src_path is None or sec.dst_path is None:
+            return
+        src_css = osp.join(sec.src_path, self.css_path)
+        dst_css = osp.join(sec.dst_path, self.css_path)
+        with open(src_css, "r", encoding="utf-8") as f:
+            css = f.read()
+        chars = self.collect_chars(sec)
+        vp("Subsetting the fonts to", len(chars), "characters")
+        hashes = (b.BuildManifest.load(osp.join(self.cache_path, "hashes.json"))
+                  if self.cache_path else None)
+        file_hash = hashes.source_hash if hashes is not None else b.file_hash
+        css_dir = osp.dirname(self.css_path)
+        jobs = []
+        # (subset, its path in the output)
+        subsets = []
+        # Paths of the subsets in use, the others are from the older builds
+        in_use = set()
+
+        def rewrite(match: re.Match) -> str:
+            rule = match.group(0)
+            src_decl = _SRC.search(rule)
+            if src_decl is None:
+                return rule
+            urls = [(_css_url(m.group(2)), m.group(4)) for m in _URL.finditer(src_decl.group(0))]
+            fonts = [(url, fmt, osp.join(sec.src_path, css_dir, url)) for url, fmt in urls]
+            if not fonts or not all(osp.exists(path) for url, fmt, path in fonts):
+                vp("Keeping the rule as it is:", rule)
+                return rule
+            # The other characters are left to the fallback fonts, which is
+            # what the browser does anyway, without downloading a shard
+            supported = font_codepoints(fonts[0][2])
+            rules = []
+            for name, codepoints in shard_codepoints(
+                    (c for c in chars if ord(c) in supported), self.shards):
+                sources = []
+                for url, fmt, path in fonts:
+                    stem, ext = osp.splitext(url)
+                    flavor = ext[1:].lower() if ext.lower() in (".woff", ".woff2") else None
+                    key = b.fingerprint("font", file_hash(path), flavor, codepoints)
+                    subset_url = "{}.{}.{}{}".format(stem.replace(" ", "_"), name, key[:10], ext)
+                    dst = osp.join(sec.dst_path, css_dir, subset_url)
+                    in_use.add(osp.normpath(dst))
+                    target = (osp.join(self.cache_path, key[:2], key + ext)
+                              if self.cache_path else dst)
+                    if not osp.exists(target):
+                        jobs.append((path, target, codepoints, flavor))
+                    if self.cache_path:
+                        subsets.append((target, dst))
+                    sources.append("url('{}')".format(subset_url)
+                                   + (" format('{}')".format(fmt) if fmt else ""))
+                rules.append(
+                    rule[:src_decl.start()]
+                    + "src: " + ",\n         ".join(sources) + ";\n"
+                    + "    unicode-range: " + unicode_range(codepoints) + ";"
+                    + rule[src_decl.end():]
+                )
+            return "\n\n".join(rules)
+
+        css = _FONT_FACE.sub(rewrite, css)
+        vp("Making {} font subsets using {} worker processes".format(len(jobs), self.workers))
+        b.run_jobs(_subset_font_job, jobs, self.workers)
+        if hashes is not None:
+            hashes.save()
+        for target, dst in subsets:
+            if not b.files_identical(target, dst):
+                b.copy_file(target, dst, sec.rules.copy_mode)
+        for dirpath in {osp.dirname(path) for path in in_use}:
+            for f in os.listdir(dirpath):
+                path = osp.normpath(osp.join(dirpath, f))
+                if _SUBSET_NAME.fullmatch(f) and path not in in_use:
+                    vp("Removing the old subset '{}'".format(path))
+                    os.remove(path)
+        # The same stylesheet would leave the mtime (and the sidecars) as is
+        minifier = b.minifier_of(sec, dst_css)
+        if b.write_if_changed(dst_css, minifier(css) if minifier else css):
+            vp("Rewriting '{}'".format(dst_css))
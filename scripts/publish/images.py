@@ -0,0 +1,186 @@
+# Copyright 2023 MohammadMohsen Akbarpoor Darabi (M. MAD)
+
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""Responsive variants of the images (resized WebP/AVIF copies at a few
+widths) for the 'srcset's of the pages; use an 'ImageVariants' as a post
+generator of the sections having pictures and 'srcsets' in their data
+extractors"""
+
+import os
+from os import path as osp
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from attrs import frozen
+
+import blogger as b
+
+try:
+    from PIL import Image, features
+except ImportError:  # It's optional; no variants are made without it
+    Image = features = None
+
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp"}
+
+# (path, mtime_ns) -> (width, height)
+_sizes: Dict[Tuple[str, int], Tuple[int, int]] = {}
+
+
+def supported_formats(formats: Iterable[str]) -> Tuple[str, ...]:
+    """the 'formats' that Pillow is able to write here"""
+    if features is None:
+        return ()
+    supported = []
+    for fmt in formats:
+        try:
+            if features.check(fmt):
+                supported.append(fmt)
+        except ValueError:  # Older Pillows do not know about the format at all
+            pass
+    return tuple(supported)
+
+
+def image_size(path: str) -> Tuple[int, int]:
+    """(width, height) of the image at 'path'; only its header is read"""
+    key = (path, os.stat(path).st_mtime_ns)
+    if key not in _sizes:
+        with Image.open(path) as img:
+            _sizes[key] = img.size
+    return _sizes[key]
+
+
+def variant_widths(width: int, widths: Iterable[int]) -> List[int]:
+    """the widths of the variants of an image 'width' pixels wide; images are
+    never upscaled"""
+    return sorted({min(w, width) for w in widths})
+
+
+def variant_path(path: str, width: int, fmt: str) -> str:
+    return "{}-{}w.{}".format(osp.splitext(path)[0], width, fmt)
+
+
+def _variant_name(formats: Iterable[str]) -> "re.Pattern":
+    return re.compile(r"^.+-\d+w\.(?:{})$".format("|".join(map(re.escape, formats))))
+
+
+def _make_variant(job):
+    src, dst, width, fmt, quality = job
+    os.makedirs(osp.dirname(osp.abspath(dst)), exist_ok=True)
+    with Image.open(src) as img:
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or "A" in img.mode
+                              else "RGB")
+        if img.width != width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))),
+                             Image.LANCZOS)
+        with b.replacing(dst) as tmp:
+            img.save(tmp, format=fmt, quality=quality)
+
+
+@frozen
+class ImageVariants:
+    widths: Tuple[int, ...] = (480, 960, 1440)
+    formats: Tuple[str, ...] = ("avif", "webp")  # The preferred one first
+    quality: int = 70
+    selectors: Tuple[str, ...] = (b.MATCH_PNG, b.MATCH_JPG)
+    cache_path: Optional[str] = None
+    workers: int = b.DEFAULT_WORKERS
+
+    def srcsets(self, dirpath: str, pic: Optional[str]) -> Tuple[Tuple[str, str], ...]:
+        """((mime type, srcset), ...) of 'pic' (relative to 'dirpath', as it
+        is in the pages) for the '<source>'s of a '<picture>'; empty if
+        there will be no variants of it"""
+        formats = supported_formats(self.formats)
+        if not pic or not formats or not b.compile_selectors(self.selectors)(pic):
+            return ()
+        try:
+            width, height = image_size(osp.join(dirpath, pic))
+        except OSError:
+            return ()
+        return tuple(
+            (MIME_TYPES.get(fmt, "image/" + fmt),
+             ", ".join("{} {}w".format(variant_path(pic, w, fmt), w)
+                       for w in variant_widths(width, self.widths)))
+            for fmt in formats
+        )
+
+    def cached_path(self, src_hash: str, width: int, fmt: str) -> str:
+        key = b.fingerprint("image", src_hash, width, fmt, self.quality)
+        return osp.join(self.cache_path, key[:2], key + "." + fmt)
+
+    def __call__(self, sec: b.SecSpec, verbose: bool = False):
+        vp = b._vpg(verbose, "[ImageVariants]")
+        formats = supported_formats(self.formats)
+        if not formats:
+            vp("Pillow is not available or can't write any of", self.formats,
+               "; skipping the image variants")
+            return
+        if sec.src_path is None or sec.dst_path is None:
+            return
+        selectors = b.compile_selectors(self.selectors)
+        # The hashes of the images by their sizes and mtimes (see
+        # 'BuildManifest.source_hash'), so the unchanged ones are not read
+        hashes = (b.BuildManifest.load(osp.join(self.cache_path, "hashes.json"))
+                  if self.cache_path else None)
+        # (path of the image to make, path of the variant)
+        variants = []
+        jobs = []
+        expected = set()
+        # dst dirpath -> the names of the sources copied to it
+        copied: Dict[str, set] = {}
+        for dirpath, dirnames, filenames in os.walk(sec.src_path):
+            copied[osp.join(sec.dst_path, osp.relpath(dirpath, sec.src_path))] = set(filenames)
+            for f in filenames:
+                if not selectors(f):
+                    continue
+                src = osp.join(dirpath, f)
+                dst = osp.join(sec.dst_path, osp.relpath(src, sec.src_path))
+                src_hash = hashes.source_hash(src) if hashes is not None else None
+                for width in variant_widths(image_size(src)[0], self.widths):
+                    for fmt in formats:
+                        variant = variant_path(dst, width, fmt)
+                        expected.add(osp.normpath(variant))
+                        if self.cache_path:
+                            target = self.cached_path(src_hash, width, fmt)
+                            variants.append((target, variant))
+                            if osp.exists(target):
+                                continue
+                        else:
+                            target = variant
+                            if (osp.exists(target)
+                                    and os.stat(target).st_mtime_ns >= os.stat(src).st_mtime_ns):
+                                continue
+                        jobs.append((src, target, width, fmt, self.quality))
+        vp("Making {} image variants using {} worker processes".format(len(jobs), self.workers))
+        b.run_jobs(_make_variant, jobs, self.workers)
+        if hashes is not None:
+            # Forgetting the removed images
+            hashes.sources = {p: h for p, h in hashes.sources.items() if osp.exists(p)}
+            hashes.save()
+        for target, variant in variants:
+            if not b.files_identical(target, variant):
+                vp("Copying", variant, "from", target)
+                b.copy_file(target, variant, sec.rules.copy_mode)
+        # The variants of the removed images and the widths an image no
+        # longer has (it's replaced by a smaller one, etc)
+        variant_name = _variant_name(self.formats)
+        for dirpath, sources in copied.items():
+            if not osp.isdir(dirpath):
+                continue
+            for f in os.listdir(dirpath):
+                path = osp.normpath(osp.join(dirpath, f))
+                if variant_name.match(f) and f not in sources and path not in expected:
+                    vp("Removing the stale variant", path)
+                    os.remove(path)
@@ -0,0 +1,171 @@
+# Copyright 2023 MohammadMohsen Akbarpoor Darabi (M. MAD)
+
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""Lossless recompression of the PNG/JPEG images of the generated site
+(palette reduction, better deflate settings and metadata stripping); use an
+'ImageOptimizer' as a post generator of the section covering them"""
+
+import os
+from os import path as osp
+import shutil as su
+import subprocess
+from typing import Optional, Tuple
+
+from attrs import frozen
+
+import blogger as b
+
+try:
+    from PIL import Image
+except ImportError:  # It's optional; only JPEGs are optimized without it
+    Image = None
+
+
+def _same_pixels(a: "Image.Image", b_: "Image.Image") -> bool:
+    if a.size != b_.size:
+        return False
+    return a.convert("RGBA").tobytes() == b_.convert("RGBA").tobytes()
+
+
+def _reduce(img: "Image.Image") -> "Image.Image":
+    """the smallest mode 'img' can be stored in without changing any pixel"""
+    if img.mode in ("1", "P"):
+        return img
+    if img.mode in ("RGBA", "LA") and img.getchannel("A").getextrema() == (255, 255):
+        img = img.convert(img.mode[:-1])
+    colors = img.getcolors(256)
+    if colors is None:
+        return img
+    if img.mode == "L" and {c for n, c in colors} <= {0, 255}:
+        return img.convert("1", dither=Image.Dither.NONE)
+    try:
+        reduced = img.quantize(colors=len(colors), method=Image.Quantize.FASTOCTREE
+                               if img.mode == "RGBA" else Image.Quantize.MEDIANCUT)
+    except ValueError:  # Not supported for this mode
+        return img
+    # Quantizers are not obliged to keep the colors as they are
+    return reduced if _same_pixels(reduced, img) else img
+
+
+def optimize_png(src: str, dst: str):
+    with Image.open(src) as img:
+        img.load()
+        icc_profile = img.info.get("icc_profile")
+        reduced = _reduce(img)
+        params = {"optimize": True}
+        # Only the color profile survives; it may change how the image looks
+        if icc_profile:
+            params["icc_profile"] = icc_profile
+        if reduced.mode == "P" and "transparency" in reduced.info:
+            params["transparency"] = reduced.info["transparency"]
+        reduced.save(dst, format="png", **params)
+        with Image.open(dst) as saved:
+            if not _same_pixels(saved, img):
+                raise ValueError("optimizing '{}' changed its pixels".format(src))
+
+
+def optimize_jpeg(src: str, dst: str):
+    """needs 'jpegtran' which rearranges the coded data without decoding it"""
+    copy = "none"
+    if Image is not None:
+        with Image.open(src) as img:
+            # Dropping these would rotate or recolor the image
+            if img.info.get("icc_profile") or img.getexif().get(0x0112, 1) != 1:
+                copy = "all"
+    subprocess.run(["jpegtran", "-copy", copy, "-optimize", "-progressive",
+                    "-outfile", dst, src], check=True, capture_output=True)
+
+
+def optimize_image(src: str, dst: str) -> bool:
+    """writes the optimized 'src' to 'dst' (or a copy of it if it can't be
+    made smaller); returns whether it's smaller"""
+    ext = osp.splitext(src)[1].lower()
+    with b.replacing(dst) as tmp:
+        if ext == ".png" and Image is not None:
+            optimize_png(src, tmp)
+        elif ext in (".jpg", ".jpeg") and su.which("jpegtran"):
+            optimize_jpeg(src, tmp)
+        else:
+            su.copy2(src, tmp)
+        smaller = os.stat(tmp).st_size < os.stat(src).st_size
+        if not smaller:
+            su.copy2(src, tmp)
+    return smaller
+
+
+def _optimize_image_job(job: Tuple[str, str]) -> bool:
+    return optimize_image(*job)
+
+
+def _replace_with(src: str, dst: str):
+    with b.replacing(dst) as tmp:
+        su.copy2(src, tmp)
+
+
+@frozen
+class ImageOptimizer:
+    """with a 'cache_path' the optimized images are kept by the hash of the
+    image they're made from (and by their own hash), so no image is ever
+    optimized twice; without it every image is optimized on every build; the
+    hashes of the images are kept there too (by their sizes and mtimes, like
+    'BuildManifest.source_hash'), so the unchanged ones are not read again"""
+    selectors: Tuple[str, ...] = (b.MATCH_PNG, b.MATCH_JPG)
+    cache_path: Optional[str] = None
+    workers: int = b.DEFAULT_WORKERS
+
+    def cached_path(self, file_hash: str, ext: str) -> str:
+        return osp.join(self.cache_path, file_hash[:2], file_hash + ext.lower())
+
+    def __call__(self, sec: b.SecSpec, verbose: bool = False):
+        vp = b._vpg(verbose, "[ImageOptimizer]")
+        if sec.dst_path is None:
+            return
+        selectors = b.compile_selectors(self.selectors)
+        hashes = (b.BuildManifest.load(osp.join(self.cache_path, "hashes.json"))
+                  if self.cache_path else None)
+        # (image, its optimized version)
+        images = []
+        jobs = []
+        for dirpath, dirnames, filenames in os.walk(sec.dst_path):
+            for f in filenames:
+                if not selectors(f):
+                    continue
+                path = osp.join(dirpath, f)
+                if self.cache_path is None:
+                    jobs.append((path, path))
+                    continue
+                optimized = self.cached_path(hashes.source_hash(path), osp.splitext(f)[1])
+                images.append((path, optimized))
+                if not osp.exists(optimized):
+                    os.makedirs(osp.dirname(optimized), exist_ok=True)
+                    jobs.append((path, optimized))
+        vp("Optimizing {} images using {} worker processes".format(len(jobs), self.workers))
+        b.run_jobs(_optimize_image_job, jobs, self.workers)
+        if self.cache_path is None:
+            return
+        for src, optimized in jobs:
+            # Keeping the optimized image by its own hash as well, so it's
+            # known to be optimized when we see it again
+            own = self.cached_path(b.file_hash(optimized), osp.splitext(optimized)[1])
+            if not osp.exists(own):
+                os.makedirs(osp.dirname(own), exist_ok=True)
+                b.copy_file(optimized, own, "hardlink")
+        for path, optimized in images:
+            if os.stat(optimized).st_size < os.stat(path).st_size:
+                vp("Replacing '{}' with its optimized version".format(path))
+                _replace_with(optimized, path)
+        # Forgetting the removed images
+        hashes.sources = {p: h for p, h in hashes.sources.items() if osp.exists(p)}
+        hashes.save()
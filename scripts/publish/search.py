@@ -0,0 +1,196 @@
+# Copyright 2023 MohammadMohsen Akbarpoor Darabi (M. MAD)
+
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""A static search index of the pages of the sections which have a
+'SecSpec.search_document_builder'; use a 'SearchIndexer' as a post generator
+of the section having them (or as its own sub_secs)
+
+The index is written to 'SearchIndexer.dirname' (relative to 'sec.dst_path'):
+'docs.json' is the list of the documents ([url, title], the url is relative
+to 'sec.dst_path'; null for the id of a removed document) and every other file is a shard of the inverted index
+({token: [[document, weight], ...]}) having the tokens that start with the
+same 'prefix_length' characters, named after their codepoints in hex joined
+by "_" (like '6a9_627.json' for "کا"); a client normalizes the query the same
+way ('normalize') and loads only the shards of its tokens"""
+
+import os
+from os import path as osp
+import re
+import json
+import itertools
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from attrs import frozen
+
+import blogger as b
+
+# Arabic letters and digits to their Persian (and ASCII digit) counterparts
+_NORMAL_CHARS = str.maketrans({
+    "ي": "ی",  # Arabic yeh
+    "ى": "ی",  # Alef maksura
+    "ك": "ک",  # Arabic kaf
+    "ة": "ه",  # Teh marbuta
+    "أ": "ا", "إ": "ا", "ٱ": "ا",  # Alefs with hamza/wasla
+    "ؤ": "و",  # Waw with hamza
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # Persian digits
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # Arabic-Indic digits
+})
+# Diacritics, tatweel and the zero width (non-)joiners; "می‌شود" and "میشود"
+# are the same word
+_DROPPED = re.compile(r"[\u064B-\u065F\u0670\u0640\u200C\u200D]")
+_WORD = re.compile(r"\w+")
+# The cached documents are tokenized; bump it whenever 'normalize' or
+# 'tokenize' change, so they are tokenized again
+TOKENIZER_VERSION = 1
+
+
+def normalize(text: str) -> str:
+    return _DROPPED.sub("", text.translate(_NORMAL_CHARS)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """the normalized words of 'text'; single characters are not searched for"""
+    return [w for w in _WORD.findall(normalize(text)) if len(w) > 1]
+
+
+def shard_name(prefix: str) -> str:
+    return "_".join("{:x}".format(ord(c)) for c in prefix)
+
+
+def assign_ids(urls: List[str], ids: Dict[str, int]) -> Dict[str, int]:
+    """the ids of the documents at 'urls'; 'ids' ({url: id}) are the ids of
+    the last build, the documents keep them (so the shards of the others do
+    not change when a document is added or removed) and the new ones get the
+    free ids in order; 'ids' is updated in place"""
+    urls = sorted(set(urls))
+    # Forgetting the removed documents frees their ids for the new ones
+    for url in set(ids).difference(urls):
+        del ids[url]
+    taken = set(ids.values())
+    free = (i for i in itertools.count() if i not in taken)
+    for url in urls:
+        if url not in ids:
+            ids[url] = next(free)
+    return ids
+
+
+def _searchable_secs(sec: b.SecSpec) -> Iterator[b.SecSpec]:
+    if sec.search_document_builder and sec.src_path and sec.dst_path:
+        yield sec
+    for s in sec.sub_secs:
+        yield from _searchable_secs(s)
+
+
+@frozen
+class SearchIndexer:
+    """the documents are cached by the size and mtime of their sources in
+    'cache_path' (if given), so only the changed sources are extracted and
+    tokenized again (the 'field_weights' are applied to the cached tokens of
+    the fields, so changing them needs no extraction); the ids of the
+    documents are kept there too (see 'assign_ids')"""
+    dirname: str = "search"
+    prefix_length: int = 2
+    # Weights of the fields of the documents, the others weigh 1
+    field_weights: Tuple[Tuple[str, int], ...] = (("title", 4), ("name", 3))
+    cache_path: Optional[str] = None
+
+    def document(self, sec: b.SecSpec, dirpath: str,
+                 f: str) -> Tuple[str, Dict[str, Dict[str, int]]]:
+        """(title, {field: {token: count}}) of the source 'f'"""
+        fields = sec.search_document_builder(dirpath, f, b.extract_data(sec, dirpath, f))
+        tokens: Dict[str, Dict[str, int]] = {}
+        for name, text in fields.items():
+            counts = tokens[name] = {}
+            for token in tokenize(str(text)):
+                counts[token] = counts.get(token, 0) + 1
+        return str(fields.get("title", "")), tokens
+
+    def weights(self, tokens: Dict[str, Dict[str, int]]) -> Dict[str, int]:
+        """{token: weight} of the fields' 'tokens' (see 'document')"""
+        field_weights = dict(self.field_weights)
+        weights: Dict[str, int] = {}
+        for name, counts in tokens.items():
+            for token, count in counts.items():
+                weights[token] = weights.get(token, 0) + count * field_weights.get(name, 1)
+        return weights
+
+    def __call__(self, sec: b.SecSpec, verbose: bool = False):
+        vp = b._vpg(verbose, "[SearchIndexer]")
+        if sec.dst_path is None:
+            return
+        cache = {}
+        if self.cache_path and osp.exists(self.cache_path):
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        ids = cache.get("ids", {})
+        # The documents of the other versions of the tokenizer (and the
+        # older caches, having the weights applied) are extracted again
+        cache = (cache.get("documents", {}) if cache.get("version") == TOKENIZER_VERSION
+                 else {})
+        # source path -> [size, mtime_ns, builder, url, title, {field: {token: count}}]
+        documents: Dict[str, list] = {}
+        extracted = 0
+        for s in _searchable_secs(sec):
+            builder = b._stable_repr(s.search_document_builder)
+            convert = b.compile_selectors(s.rules.convert_selectors)
+            exceptions = b.compile_selectors(b.CE)
+            for dirpath, dirnames, filenames in os.walk(s.src_path):
+                for f in filenames:
+                    if not convert(f) or exceptions(f):
+                        continue
+                    path = osp.normpath(osp.join(dirpath, f))
+                    st = os.stat(path)
+                    cached = cache.get(path)
+                    if cached is None or cached[:3] != [st.st_size, st.st_mtime_ns, builder]:
+                        # The same as where 'content_generator' puts the page
+                        page = osp.join(s.dst_path, osp.splitext(f)[0] + ".html")
+                        cached = [st.st_size, st.st_mtime_ns, builder,
+                                  osp.relpath(page, sec.dst_path).replace(os.sep, "/"),
+                                  *self.document(s, dirpath, f)]
+                        extracted += 1
+                    documents[path] = cached
+                if not s.rules.recursive_convert:
+                    break
+        vp("Indexing {} documents ({} extracted)".format(len(documents), extracted))
+        assign_ids([d[3] for d in documents.values()], ids)
+        if self.cache_path:
+            os.makedirs(osp.dirname(osp.abspath(self.cache_path)), exist_ok=True)
+            b.write_if_changed(self.cache_path, json.dumps(
+                {"version": TOKENIZER_VERSION, "documents": documents, "ids": ids},
+                ensure_ascii=False))
+
+        docs: List[Optional[List[str]]] = [None] * (max(ids.values()) + 1 if ids else 0)
+        shards: Dict[str, Dict[str, List[List[int]]]] = {}
+        for size, mtime_ns, builder, url, title, tokens in sorted(documents.values(),
+                                                                  key=lambda d: ids[d[3]]):
+            docs[ids[url]] = [url, title]
+            for token, weight in self.weights(tokens).items():
+                postings = shards.setdefault(token[:self.prefix_length], {}).setdefault(token, [])
+                postings.append([ids[url], weight])
+        index_path = osp.join(sec.dst_path, self.dirname)
+        os.makedirs(index_path, exist_ok=True)
+        written = {"docs.json"}
+        b.write_if_changed(osp.join(index_path, "docs.json"), json.dumps(
+            docs, ensure_ascii=False, separators=(",", ":")))
+        for prefix, shard in shards.items():
+            name = shard_name(prefix) + ".json"
+            written.add(name)
+            b.write_if_changed(osp.join(index_path, name), json.dumps(
+                shard, ensure_ascii=False, sort_keys=True, separators=(",", ":")))
+        for f in os.listdir(index_path):
+            if f.endswith(".json") and f not in written:
+                vp("Removing the stale shard '{}'".format(f))
+                os.remove(osp.join(index_path, f))
+        vp("Wrote {} shards to '{}'".format(len(shards), index_path))
@@ -0,0 +1,125 @@
+# Copyright 2023 MohammadMohsen Akbarpoor Darabi (M. MAD)
+
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+"""Rebuilds the pages whose sources change while it's running (and the
+whole site, incrementally, when a template changes); run it like
+'museum.py', from the root of the repository"""
+
+import os
+from os import path as osp
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import blogger as b
+import museum
+
+try:
+    import inotify_simple
+except ImportError:  # It's optional; we poll without it
+    inotify_simple = None
+
+SOURCES = "scripts/original_content"
+TEMPLATES = "scripts/templates"
+POLL_INTERVAL = 0.5  # in seconds
+
+
+def _snapshot(tops: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+    snapshot = {}
+    for top in tops:
+        for dirpath, dirnames, filenames in os.walk(top):
+            for f in filenames:
+                path = osp.join(dirpath, f)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:  # Removed while walking
+                    continue
+                snapshot[path] = (st.st_size, st.st_mtime_ns)
+    return snapshot
+
+
+def poll_changes(tops: Iterable[str], interval: float = POLL_INTERVAL) -> Iterator[List[str]]:
+    """yields the files that are created or modified since the last time"""
+    tops = list(tops)
+    before = _snapshot(tops)
+    while True:
+        time.sleep(interval)
+        after = _snapshot(tops)
+        changed = sorted(p for p, st in after.items() if before.get(p) != st)
+        before = after
+        if changed:
+            yield changed
+
+
+def inotify_changes(tops: Iterable[str]) -> Iterator[List[str]]:
+    """the same as 'poll_changes', but it's told by the kernel"""
+    inotify = inotify_simple.INotify()
+    flags = inotify_simple.flags
+    mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE
+    dirs = {}
+
+    def watch(top):
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirs[inotify.add_watch(dirpath, mask)] = dirpath
+
+    for top in tops:
+        watch(top)
+    while True:
+        changed = set()
+        # 'read_delay' gathers the events of a single save (editors write
+        # several times, or write a temporary file and move it)
+        for event in inotify.read(read_delay=100):
+            path = osp.join(dirs[event.wd], event.name)
+            if event.mask & flags.ISDIR:
+                watch(path)
+            elif osp.isfile(path):
+                changed.add(path)
+        if changed:
+            yield sorted(changed)
+
+
+def main():
+    args = museum.GENERATOR_ARGS
+    b.configure_environments(bytecode_cache_dir=".jinja_cache")
+    print("Building the site before watching it...")
+    # It also warms up the data stores which are shared with the rebuilds
+    b.generator(museum.document_root, **args)
+    changes = inotify_changes if inotify_simple is not None else poll_changes
+    print("Watching '{}' and '{}' (Ctrl+C to stop)".format(SOURCES, TEMPLATES))
+    try:
+        for changed in changes([SOURCES, TEMPLATES]):
+            start = time.perf_counter()
+            if any(osp.commonpath([osp.abspath(TEMPLATES), osp.abspath(p)])
+                   == osp.abspath(TEMPLATES) for p in changed):
+                print("A template is changed; rebuilding the site")
+                b.configure_environments(bytecode_cache_dir=".jinja_cache")
+                b.generator(museum.document_root, **args)
+            else:
+                manifest = (b.BuildManifest.load(args["manifest_path"])
+                            if args.get("manifest_path") else None)
+                qr_cache = b.QRCache(args["qr_cache_path"]) if args.get("qr_cache_path") else None
+                for path in changed:
+                    print("Rebuilding '{}'".format(path))
+                    b.rebuild(museum.document_root, path, manifest=manifest,
+                              qr_cache=qr_cache, **args)
+                if manifest is not None:
+                    manifest.save()
+            print("Done in {:.2f}s".format(time.perf_counter() - start))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
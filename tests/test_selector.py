@@ -0,0 +1,35 @@
+# Copyright 2023 MohammadMohsen Akbarpoor Darabi (M. MAD)
+
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.
+
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <https://www.gnu.org/licenses/>.
+
+import re
+
+import pytest
+
+import blogger as b
+
+PATTERNS = (b.MATCH_MD, b.MATCH_HTML, b.MATCH_PNG, b.MATCH_JPG, r"^index\.png$")
+NAMES = ("a.md", "A.MD", ".md", "md", "amd", "a.md.bak", "a.html", "html", "a.png",
+         "png", "a.jpeg", "jpeg", "index.png", "a.txt", "")
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_selector_matches_the_patterns(name):
+    expected = b.re_collection_searcher([re.compile(p) for p in PATTERNS], name)
+    assert b.Selector(PATTERNS)(name) == expected
+
+
+@pytest.mark.parametrize("name", ("md", "html", "png", "amd"))
+def test_extension_needs_a_dot(name):
+    assert not b.Selector((b.MATCH_MD, b.MATCH_HTML, b.MATCH_PNG))(name)